@@ -0,0 +1,150 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """
+    Thread-safe histogram with fixed upper bucket bounds. Snapshots report
+    cumulative counts per bound, following the Prometheus convention.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[str(bound)] = running
+        running += counts[-1]
+        cumulative["+Inf"] = running
+        return {"count": running, "sum": total, "buckets": cumulative}
+
+
+class BatcherStoppedError(RuntimeError):
+    """Raised to callers whose request had not been scored when the batcher stopped."""
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row predictions into one model call.
+
+    Requests are queued on the event loop. A single worker task takes the first
+    waiting request, keeps collecting until either `max_batch_size` rows are
+    gathered or `max_wait_ms` has elapsed, scores the batch in the threadpool
+    and resolves each caller's future with its own prediction. `stop` fails
+    every request not yet scored with BatcherStoppedError.
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        # predict_fn takes a list of feature dicts and returns one prediction per row.
+        self._predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = None
+        self._worker = None
+        # Requests taken off the queue for the batch being collected or scored.
+        self._collecting = []
+        self.batch_size_histogram = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512])
+        self.queue_wait_histogram = Histogram([0.5, 1, 2, 5, 10, 25, 50, 100, 250])  # milliseconds
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Micro-batching enabled (max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait * 1000:g})")
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        # Nothing will score these any more; fail them rather than leave their callers hanging.
+        pending, self._collecting = self._collecting, []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(BatcherStoppedError("The micro-batcher stopped before this request was scored."))
+
+    async def submit(self, record: dict):
+        if self._worker is None:
+            raise BatcherStoppedError("The micro-batcher is not running.")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future, time.perf_counter()))
+        return await future
+
+    def metrics(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_wait_ms": self.queue_wait_histogram.snapshot(),
+        }
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = self._collecting = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Anything that arrived while we were waiting on the clock rides along too.
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            dispatched_at = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.queue_wait_histogram.observe((dispatched_at - enqueued_at) * 1000)
+            self.batch_size_histogram.observe(len(batch))
+            await self._score(batch)
+            self._collecting = []
+
+    async def _score(self, batch):
+        records = [record for record, _, _ in batch]
+        try:
+            predictions = await run_in_threadpool(self._predict_fn, records)
+        except Exception as e:
+            if len(batch) == 1:
+                _, future, _ = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            # Re-score row by row so one bad input does not fail its neighbours.
+            logger.warning(f"Batch of {len(batch)} failed ({e}); retrying rows individually.")
+            for item in batch:
+                await self._score([item])
+            return
+        for (_, future, _), prediction in zip(batch, predictions):
+            if not future.done():
+                future.set_result(prediction)
@@ -0,0 +1,91 @@
+import json
+import mmap
+
+import numpy as np
+
+COMPILED_MODEL_MAGIC = b"HOUSEMDL"
+
+
+class CompiledModel:
+    """
+    NumPy-only inference engine for the flattened pipeline exported by
+    `05_model_deployment.export_compiled_model`.
+
+    The export is memory-mapped read-only and its arrays are viewed in place,
+    so loading is near-instant and every worker process shares the same
+    physical pages through the OS page cache.
+
+    Reproduces ColumnTransformer(StandardScaler, OneHotEncoder(handle_unknown='ignore'))
+    followed by a RandomForestRegressor. All trees are descended together: each
+    step gathers the current node of every (row, tree) pair, and leaves point to
+    themselves so `max_depth` steps always land on a leaf.
+    """
+
+    def __init__(self, meta, arrays):
+        self.numerical_features = meta["numerical_features"]
+        self.categorical_features = meta["categorical_features"]
+        # One {category: output column} map per categorical feature.
+        self.category_index = []
+        column = len(self.numerical_features)
+        for categories in meta["categories"]:
+            self.category_index.append({c: column + i for i, c in enumerate(categories)})
+            column += len(categories)
+        self.n_features = column
+        self.max_depth = meta["max_depth"]
+        self.scaler_mean = arrays["scaler_mean"]
+        self.scaler_scale = arrays["scaler_scale"]
+        self.children_left = arrays["children_left"]
+        self.children_right = arrays["children_right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledModel":
+        with open(path, "rb") as f:
+            if f.read(len(COMPILED_MODEL_MAGIC)) != COMPILED_MODEL_MAGIC:
+                raise ValueError(f"{path} is not a compiled model export.")
+            header_length = int.from_bytes(f.read(8), "little")
+            meta = json.loads(f.read(header_length))
+            # The mapping outlives the file object; the arrays below keep it alive.
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data_start = len(COMPILED_MODEL_MAGIC) + 8 + header_length
+        arrays = {}
+        for name, spec in meta.pop("arrays").items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            array = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + spec["offset"])
+            arrays[name] = array.reshape(spec["shape"])
+        return cls(meta, arrays)
+
+    def _transform(self, numerical, categorical_columns):
+        X = np.zeros((numerical.shape[0], self.n_features), dtype=np.float64)
+        X[:, :len(self.numerical_features)] = (numerical - self.scaler_mean) / self.scaler_scale
+        for index, values in zip(self.category_index, categorical_columns):
+            for row, value in enumerate(values):
+                column = index.get(str(value))
+                if column is not None:  # unknown categories encode as all zeros
+                    X[row, column] = 1.0
+        # The forest compares float32 features against its thresholds, exactly like sklearn.
+        return X.astype(np.float32)
+
+    def transform(self, X) -> np.ndarray:
+        """Accepts a DataFrame or a list of feature dicts; returns the model matrix."""
+        if hasattr(X, "columns"):
+            numerical = X[self.numerical_features].to_numpy(dtype=np.float64)
+            categorical = [X[c].tolist() for c in self.categorical_features]
+        else:
+            numerical = np.array([[row[c] for c in self.numerical_features] for row in X], dtype=np.float64)
+            categorical = [[row[c] for row in X] for c in self.categorical_features]
+        return self._transform(numerical.reshape(-1, len(self.numerical_features)), categorical)
+
+    def predict(self, X) -> np.ndarray:
+        X = self.transform(X)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.roots.shape[0])).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+        return self.value[nodes].mean(axis=1)
+
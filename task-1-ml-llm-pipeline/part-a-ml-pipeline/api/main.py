@@ -1,17 +1,57 @@
 import os
-import pickle
+import json
+import time
+from functools import partial
 import pandas as pd
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 import logging
 
+from batching import BatcherStoppedError, MicroBatcher
+from compiled_model import CompiledModel
+from model_store import ModelStore, load_model_artifact
+from prediction_cache import PredictionCache
+from shadow import ShadowScorer
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow payloads are optional; JSON batches work without it.
+    pa = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="ML Model Prediction API", version="1.0.0")
 
-model = None
 MODEL_PATH = os.environ.get("MODEL_PATH", "/app/model/model.pkl")
+# Written next to the model by the deployment task; carries the registry version.
+MODEL_METADATA_PATH = os.environ.get("MODEL_METADATA_PATH", os.path.join(os.path.dirname(MODEL_PATH), "model_metadata.json"))
+# How often the model file is checked for a new deployment. 0 disables the watcher.
+MODEL_RELOAD_INTERVAL_S = float(os.environ.get("MODEL_RELOAD_INTERVAL_S", "10"))
+# NumPy-only export of the pipeline; served instead of the pickle when present.
+COMPILED_MODEL_PATH = os.environ.get("COMPILED_MODEL_PATH", os.path.join(os.path.dirname(MODEL_PATH), "model_compiled.bin"))
+# Number of predictions serialized per chunk when streaming a batch response.
+BATCH_STREAM_CHUNK_SIZE = int(os.environ.get("BATCH_STREAM_CHUNK_SIZE", "1000"))
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+ARROW_FILE_CONTENT_TYPE = "application/vnd.apache.arrow.file"
+# Optional micro-batching of concurrent /predict calls into one model call.
+MICROBATCH_ENABLED = os.environ.get("MICROBATCH_ENABLED", "false").lower() == "true"
+MICROBATCH_MAX_BATCH_SIZE = int(os.environ.get("MICROBATCH_MAX_BATCH_SIZE", "64"))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("MICROBATCH_MAX_WAIT_MS", "5"))
+# Optional LRU/TTL cache of /predict results. 0 disables it.
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "0"))
+PREDICTION_CACHE_TTL_S = float(os.environ.get("PREDICTION_CACHE_TTL_S", "300"))
+# Optional shadow model scored on live traffic off the request path. Unset disables it.
+SHADOW_MODEL_PATH = os.environ.get("SHADOW_MODEL_PATH")
+# Rows handed to the shadow process but not yet scored; further shadow work is dropped.
+SHADOW_QUEUE_ROWS = int(os.environ.get("SHADOW_QUEUE_ROWS", "10000"))
+# Larger batches are mirrored as a random sample of this many rows.
+SHADOW_MAX_BATCH_ROWS = int(os.environ.get("SHADOW_MAX_BATCH_ROWS", "1024"))
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", "1.0"))
+
+batcher = None
 
 class HousingFeatures(BaseModel):
     longitude: float
@@ -24,19 +64,70 @@ class HousingFeatures(BaseModel):
     median_income: float
     ocean_proximity: str
 
+FEATURE_COLUMNS = list(HousingFeatures.__fields__)
+
+_load_model = partial(load_model_artifact, compiled_path=COMPILED_MODEL_PATH)
+
+model_store = ModelStore(MODEL_PATH, MODEL_METADATA_PATH, _load_model, watch_paths=[COMPILED_MODEL_PATH])
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_S) if PREDICTION_CACHE_SIZE > 0 else None
+if prediction_cache is not None:
+    model_store.add_swap_listener(lambda served: prediction_cache.clear())
+
 @app.on_event("startup")
 def load_model():
-    global model
     try:
-        if os.path.exists(MODEL_PATH):
-            with open(MODEL_PATH, "rb") as f:
-                model = pickle.load(f)
-            logger.info(f"Model loaded successfully from {MODEL_PATH}")
-        else:
-            logger.warning(f"Model file not found at {MODEL_PATH}. The /predict endpoint will not work until a model is deployed.")
+        model_store.reload(force=True)
     except Exception as e:
         logger.error(f"Error loading model: {e}")
-        model = None
+    model_store.start_watcher(MODEL_RELOAD_INTERVAL_S)
+
+@app.on_event("shutdown")
+def stop_model_watcher():
+    model_store.stop_watcher()
+
+def _served_model():
+    served = model_store.current
+    if served is None:
+        raise HTTPException(status_code=503, detail="Model is not loaded. Please trigger the Airflow pipeline to train and deploy a model.")
+    return served
+
+def _predict_records(records, model=None):
+    model = model if model is not None else model_store.current.model
+    if isinstance(model, CompiledModel):
+        return model.predict(records)
+    return model.predict(pd.DataFrame(records, columns=FEATURE_COLUMNS))
+
+shadow_scorer = None
+if SHADOW_MODEL_PATH:
+    # Same artifact layout as the primary: metadata and compiled export sit next to the pickle.
+    shadow_dir = os.path.dirname(SHADOW_MODEL_PATH)
+    shadow_scorer = ShadowScorer(SHADOW_MODEL_PATH, os.path.join(shadow_dir, "model_metadata.json"),
+                                 os.path.join(shadow_dir, "model_compiled.bin"), FEATURE_COLUMNS,
+                                 max_queue_rows=SHADOW_QUEUE_ROWS, max_batch_rows=SHADOW_MAX_BATCH_ROWS,
+                                 sample_rate=SHADOW_SAMPLE_RATE, reload_interval_s=MODEL_RELOAD_INTERVAL_S)
+
+@app.on_event("startup")
+def start_shadow():
+    if shadow_scorer is not None:
+        shadow_scorer.start()
+
+@app.on_event("shutdown")
+def stop_shadow():
+    if shadow_scorer is not None:
+        shadow_scorer.stop()
+
+@app.on_event("startup")
+async def start_batcher():
+    global batcher
+    if MICROBATCH_ENABLED:
+        batcher = MicroBatcher(_predict_records, MICROBATCH_MAX_BATCH_SIZE, MICROBATCH_MAX_WAIT_MS)
+        await batcher.start()
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    if batcher is not None:
+        await batcher.stop()
 
 @app.get("/", tags=["General"])
 def read_root():
@@ -44,18 +135,188 @@ def read_root():
 
 @app.get("/health", tags=["General"])
 def health_check():
-    status = "OK" if model is not None else "Model not loaded"
-    return {"status": status, "model_path": MODEL_PATH}
+    served = model_store.current
+    status = "OK" if served is not None else "Model not loaded"
+    return {
+        "status": status,
+        "model_path": MODEL_PATH,
+        "model_version": served.version if served is not None else None,
+        "model_loaded_at": served.loaded_at if served is not None else None,
+    }
+
+def _reload_model():
+    try:
+        model_store.reload(force=True)
+    except Exception as e:
+        logger.error(f"Error reloading model: {e}")
+
+@app.post("/admin/reload", status_code=202, tags=["Admin"])
+def reload_model(background_tasks: BackgroundTasks):
+    """
+    Loads the artifact at MODEL_PATH in the background and swaps it in.
+    Requests already in flight finish on the previous model.
+    """
+    background_tasks.add_task(_reload_model)
+    return {"status": "Reload scheduled", "model_path": MODEL_PATH}
+
+@app.get("/metrics", tags=["General"])
+def metrics():
+    return {
+        "microbatch": batcher.metrics() if batcher is not None else None,
+        "prediction_cache": prediction_cache.stats() if prediction_cache is not None else None,
+    }
+
+@app.get("/shadow/stats", tags=["General"])
+def shadow_stats():
+    """Agreement between the served and shadow models on live traffic, plus per-row latencies."""
+    if shadow_scorer is None:
+        raise HTTPException(status_code=404, detail="Shadow scoring is disabled. Set SHADOW_MODEL_PATH to enable it.")
+    served = model_store.current
+    return dict(shadow_scorer.stats(), primary_model_version=served.version if served is not None else None)
+
+@app.post("/shadow/reset", tags=["Admin"])
+def reset_shadow_stats():
+    """Clears the aggregated stats, e.g. after a new shadow or primary deployment."""
+    if shadow_scorer is None:
+        raise HTTPException(status_code=404, detail="Shadow scoring is disabled. Set SHADOW_MODEL_PATH to enable it.")
+    shadow_scorer.reset()
+    return {"status": "Shadow stats reset"}
 
 @app.post("/predict", tags=["Prediction"])
-def predict(features: HousingFeatures):
-    if model is None:
-        raise HTTPException(status_code=503, detail="Model is not loaded. Please trigger the Airflow pipeline to train and deploy a model.")
+async def predict(features: HousingFeatures):
+    served = _served_model()
+    record = features.dict()
+
+    cache_key = None
+    if prediction_cache is not None:
+        cache_key = PredictionCache.key_for(served.version, record)
+        found, prediction = prediction_cache.get(cache_key)
+        if found:
+            return {"predicted_median_house_value": prediction}
 
     try:
-        input_data = pd.DataFrame([features.dict()])
-        prediction = model.predict(input_data)
-        return {"predicted_median_house_value": prediction[0]}
+        start = time.perf_counter()
+        if batcher is not None:
+            prediction = await batcher.submit(record)
+        elif isinstance(served.model, CompiledModel):
+            # Microseconds per row: cheaper to score inline than to hop to the threadpool.
+            prediction = served.model.predict([record])[0]
+        else:
+            prediction = (await run_in_threadpool(_predict_records, [record], served.model))[0]
+        if shadow_scorer is not None:
+            shadow_scorer.submit([record], [prediction], time.perf_counter() - start)
+        if cache_key is not None:
+            prediction_cache.put(cache_key, prediction)
+        return {"predicted_median_house_value": prediction}
+    except BatcherStoppedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error during prediction: {e}")
         raise HTTPException(status_code=400, detail=f"Error processing prediction: {str(e)}")
+
+def _read_arrow_frame(body: bytes, content_type: str) -> pd.DataFrame:
+    if pa is None:
+        raise HTTPException(status_code=415, detail="Arrow payloads require pyarrow to be installed on the server.")
+    try:
+        if content_type == ARROW_FILE_CONTENT_TYPE:
+            table = pa.ipc.open_file(pa.BufferReader(body)).read_all()
+        else:
+            table = pa.ipc.open_stream(body).read_all()
+    except pa.ArrowInvalid as e:
+        raise HTTPException(status_code=400, detail=f"Invalid Arrow payload: {e}")
+    missing = [c for c in FEATURE_COLUMNS if c not in table.column_names]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Arrow payload is missing columns: {missing}")
+    return table.select(FEATURE_COLUMNS).to_pandas()
+
+def _validate_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Checks and coerces a batch once per column, with the same rules as
+    `HousingFeatures`: numeric features must be numbers (or numeric strings),
+    and no feature may be missing or null.
+    """
+    missing = [c for c in FEATURE_COLUMNS if c not in df.columns]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Batch payload is missing columns: {missing}")
+    frame = {}
+    for column in FEATURE_COLUMNS:
+        values = df[column]
+        if column == "ocean_proximity":
+            if pd.api.types.infer_dtype(values, skipna=False) != "string":
+                invalid = ~values.map(lambda v: isinstance(v, (str, int, float)) and v == v)
+                if invalid.any():
+                    raise HTTPException(status_code=422, detail=f"Row {int(invalid.to_numpy().argmax())}: '{column}' must be a string.")
+                values = values.astype(str)
+        else:
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values, errors="coerce")
+            invalid = values.isna()
+            if invalid.any():
+                raise HTTPException(status_code=422, detail=f"Row {int(invalid.to_numpy().argmax())}: '{column}' must be a number.")
+            values = values.astype("float64")
+        frame[column] = values.reset_index(drop=True)
+    return pd.DataFrame(frame, columns=FEATURE_COLUMNS)
+
+def _read_json_frame(payload) -> pd.DataFrame:
+    if isinstance(payload, list):
+        if not all(isinstance(row, dict) for row in payload):
+            raise HTTPException(status_code=422, detail="Every record of a batch must be an object.")
+        if not payload:
+            return pd.DataFrame(columns=FEATURE_COLUMNS)
+        return _validate_frame(pd.DataFrame.from_records(payload))
+    if isinstance(payload, dict):
+        columns = {c: payload[c] for c in FEATURE_COLUMNS if c in payload}
+        if not all(isinstance(values, list) for values in columns.values()):
+            raise HTTPException(status_code=422, detail="Every feature of a columnar batch must be a list.")
+        if len({len(values) for values in columns.values()}) > 1:
+            raise HTTPException(status_code=422, detail="All feature columns must have the same length.")
+        return _validate_frame(pd.DataFrame(columns))
+    raise HTTPException(status_code=422, detail="Batch payload must be a list of records or an object of feature columns.")
+
+def _parse_batch_frame(body: bytes, content_type: str) -> pd.DataFrame:
+    if content_type in (ARROW_STREAM_CONTENT_TYPE, ARROW_FILE_CONTENT_TYPE):
+        return _validate_frame(_read_arrow_frame(body, content_type))
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON payload: {e}")
+    return _read_json_frame(payload)
+
+async def _read_batch_frame(request: Request) -> pd.DataFrame:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    body = await request.body()
+    # Decoding and validating thousands of rows takes long enough to stall other requests on the event loop.
+    return await run_in_threadpool(_parse_batch_frame, body, content_type)
+
+def _stream_predictions(predictions):
+    """Serializes predictions as a JSON document in chunks, preserving input order."""
+    yield '{"predicted_median_house_value": ['
+    for start in range(0, len(predictions), BATCH_STREAM_CHUNK_SIZE):
+        chunk = predictions[start:start + BATCH_STREAM_CHUNK_SIZE]
+        yield ("," if start else "") + json.dumps(chunk.tolist())[1:-1]
+    yield "]}"
+
+@app.post("/predict/batch", tags=["Prediction"])
+async def predict_batch(request: Request):
+    """
+    Scores many rows with a single vectorized model call.
+
+    Accepts a JSON list of `HousingFeatures` records, a columnar JSON object
+    (`{"longitude": [...], "latitude": [...], ...}`) or an Arrow IPC payload
+    (`Content-Type: application/vnd.apache.arrow.stream` or `.file`).
+    """
+    served = _served_model()
+
+    input_data = await _read_batch_frame(request)
+    if input_data.empty:
+        return {"predicted_median_house_value": []}
+
+    try:
+        start = time.perf_counter()
+        predictions = await run_in_threadpool(served.model.predict, input_data)
+    except Exception as e:
+        logger.error(f"Error during batch prediction: {e}")
+        raise HTTPException(status_code=400, detail=f"Error processing batch prediction: {str(e)}")
+    if shadow_scorer is not None:
+        shadow_scorer.submit(input_data, predictions, time.perf_counter() - start)
+    return StreamingResponse(_stream_predictions(predictions), media_type="application/json")
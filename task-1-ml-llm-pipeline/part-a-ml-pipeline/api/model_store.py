@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import Any, Callable, NamedTuple, Optional
+
+from compiled_model import CompiledModel
+
+logger = logging.getLogger(__name__)
+
+
+def load_model_artifact(path: str, compiled_path: Optional[str] = None):
+    """Loads the NumPy export at `compiled_path` if there is one, else the pickled pipeline at `path`."""
+    if compiled_path and os.path.exists(compiled_path):
+        logger.info(f"Using compiled model from {compiled_path}")
+        return CompiledModel.load(compiled_path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class ServedModel(NamedTuple):
+    model: Any
+    version: str
+    loaded_at: float
+
+
+class ModelStore:
+    """
+    Holds the model currently being served and swaps in new artifacts atomically.
+
+    `current` is replaced with a single reference assignment, so a request that
+    has already read it keeps scoring on the old model while new requests pick
+    up the new one. Reloads are serialized and a failed load leaves the
+    previously served model in place.
+    """
+
+    def __init__(self, model_path: str, metadata_path: str, loader: Callable[[str], Any], watch_paths=()):
+        self.model_path = model_path
+        self.metadata_path = metadata_path
+        # Additional artifacts the loader may read; a change to any of them triggers a reload.
+        self.watch_paths = tuple(watch_paths)
+        self._loader = loader
+        self.current: Optional[ServedModel] = None
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._swap_listeners = []
+
+    def _fingerprint_of(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_version(self) -> str:
+        try:
+            with open(self.metadata_path) as f:
+                return str(json.load(f)["version"])
+        except (FileNotFoundError, KeyError, ValueError):
+            # No deployment metadata: fall back to the artifact's modification time.
+            return f"mtime-{int(os.path.getmtime(self.model_path))}"
+
+    def reload(self, force: bool = False) -> bool:
+        """Loads the artifact if it changed since the last load. Returns True on swap."""
+        with self._lock:
+            paths = (self.model_path, self.metadata_path) + self.watch_paths
+            fingerprint = tuple(self._fingerprint_of(path) for path in paths)
+            if fingerprint[0] is None:
+                logger.warning(f"Model file not found at {self.model_path}. The /predict endpoint will not work until a model is deployed.")
+                return False
+            if not force and fingerprint == self._fingerprint:
+                return False
+            model = self._loader(self.model_path)
+            served = ServedModel(model=model, version=self._read_version(), loaded_at=time.time())
+            self.current = served
+            self._fingerprint = fingerprint
+            logger.info(f"Serving model version {served.version} from {self.model_path}")
+        for listener in self._swap_listeners:
+            listener(served)
+        return True
+
+    def add_swap_listener(self, listener: Callable[[ServedModel], None]):
+        """Registers a callback invoked with the new ServedModel after every swap."""
+        self._swap_listeners.append(listener)
+
+    def start_watcher(self, interval_s: float):
+        if interval_s <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval_s,), name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self, interval_s: float):
+        while not self._stop.wait(interval_s):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Error reloading model from {self.model_path}: {e}")
@@ -0,0 +1,207 @@
+import itertools
+import logging
+import random
+import threading
+from functools import partial
+from multiprocessing import get_context
+import time
+
+import numpy as np
+import pandas as pd
+
+from batching import Histogram
+from model_store import ModelStore, load_model_artifact
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = [0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000]
+# Relative disagreement bounds reported as "share of rows within x%".
+AGREEMENT_TOLERANCES = (0.01, 0.05, 0.10)
+
+
+def _shadow_worker(model_path, metadata_path, compiled_path, feature_columns, reload_interval_s, requests, results):
+    """
+    Runs in the shadow process: owns the shadow model, reloads it when it is
+    redeployed and scores every batch it is sent. Replies with
+    (batch id, predictions or None, seconds, model version, error or None).
+    """
+    logging.basicConfig(level=logging.INFO)
+    store = ModelStore(model_path, metadata_path, partial(load_model_artifact, compiled_path=compiled_path),
+                       watch_paths=[compiled_path])
+    try:
+        store.reload(force=True)
+    except Exception as e:
+        logger.error(f"Error loading shadow model: {e}")
+    store.start_watcher(reload_interval_s)
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        batch_id, rows = item
+        served = store.current
+        if served is None:
+            results.put((batch_id, None, 0.0, None, "Shadow model is not loaded."))
+            continue
+        try:
+            frame = rows if hasattr(rows, "columns") else pd.DataFrame(rows, columns=feature_columns)
+            start = time.perf_counter()
+            predictions = np.asarray(served.model.predict(frame), dtype=np.float64)
+            results.put((batch_id, predictions, time.perf_counter() - start, served.version, None))
+        except Exception as e:
+            results.put((batch_id, None, 0.0, served.version, str(e)))
+    store.stop_watcher()
+
+
+class ShadowScorer:
+    """
+    Scores a second (shadow) model on the same inputs as the primary, in a
+    separate process so shadow work never holds the API process's GIL.
+
+    Requests hand over their rows unchanged (a DataFrame or a list of feature
+    dicts) with a non-blocking put, keeping their primary predictions here.
+    Work is bounded by rows, not requests: a batch larger than
+    `max_batch_rows` is mirrored as a random sample of that many rows, and
+    once `max_queue_rows` rows are waiting for the shadow, further work is
+    dropped and counted. A collector thread matches the shadow predictions
+    with the primary ones and aggregates disagreement and latency statistics.
+    """
+
+    def __init__(self, model_path: str, metadata_path: str, compiled_path: str, feature_columns,
+                 max_queue_rows: int = 10_000, max_batch_rows: int = 1024, sample_rate: float = 1.0,
+                 reload_interval_s: float = 10):
+        self._worker_args = (model_path, metadata_path, compiled_path, list(feature_columns), reload_interval_s)
+        self.max_queue_rows = max_queue_rows
+        self.max_batch_rows = max_batch_rows
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+        self._batch_ids = itertools.count()
+        self._pending = {}  # batch id -> (primary predictions, primary latency in seconds per row)
+        self._pending_rows = 0
+        self._process = None
+        self._collector = None
+        self.shadow_model_version = None
+        self.primary_latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.shadow_latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.submitted = 0
+        self.dropped = 0
+        self.dropped_rows = 0
+        self.errors = 0
+        self.rows = 0
+        self.sum_abs_diff = 0.0
+        self.sum_sq_diff = 0.0
+        self.sum_rel_diff = 0.0
+        self.max_abs_diff = 0.0
+        self.within = {t: 0 for t in AGREEMENT_TOLERANCES}
+
+    def start(self):
+        # Spawned, not forked: the API process runs threads and an event loop.
+        context = get_context("spawn")
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        self._process = context.Process(target=_shadow_worker, args=(*self._worker_args, self._requests, self._results),
+                                        name="shadow-scorer", daemon=True)
+        self._process.start()
+        self._collector = threading.Thread(target=self._collect, name="shadow-collector", daemon=True)
+        self._collector.start()
+
+    def stop(self):
+        if self._process is None:
+            return
+        self._requests.put(None)
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._results.put(None)
+        self._collector.join()
+        self._process = self._collector = None
+
+    def submit(self, rows, primary_predictions, primary_latency_s: float):
+        """Hands rows (a list of dicts or a DataFrame) to the shadow process; never blocks."""
+        if self._process is None or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return
+        primary = np.asarray(primary_predictions, dtype=np.float64)
+        latency_per_row_s = primary_latency_s / max(len(primary), 1)
+        if len(primary) > self.max_batch_rows:
+            keep = np.sort(self._rng.choice(len(primary), self.max_batch_rows, replace=False))
+            rows = rows.iloc[keep] if hasattr(rows, "iloc") else [rows[i] for i in keep]
+            primary = primary[keep]
+        with self._lock:
+            if self._pending_rows + len(primary) > self.max_queue_rows:
+                self.dropped += 1
+                self.dropped_rows += len(primary)
+                return
+            batch_id = next(self._batch_ids)
+            self._pending[batch_id] = (primary, latency_per_row_s)
+            self._pending_rows += len(primary)
+            self.submitted += 1
+        # Pickling and the pipe write happen on the queue's feeder thread, not here.
+        self._requests.put((batch_id, rows))
+
+    def _collect(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                return
+            batch_id, shadow, latency_s, version, error = item
+            with self._lock:
+                primary, primary_latency_s = self._pending.pop(batch_id)
+                self._pending_rows -= len(primary)
+            if version is not None:
+                self.shadow_model_version = version
+            if error is not None:
+                with self._lock:
+                    self.errors += 1
+                logger.warning(f"Shadow scoring failed: {error}")
+                continue
+            self._record(primary, primary_latency_s, shadow, latency_s)
+
+    def _record(self, primary, primary_latency_s, shadow, shadow_latency_s):
+        self.primary_latency_ms.observe(primary_latency_s * 1000)
+        self.shadow_latency_ms.observe(shadow_latency_s * 1000 / len(primary))
+        abs_diff = np.abs(shadow - primary)
+        rel_diff = abs_diff / np.maximum(np.abs(primary), 1e-9)
+        with self._lock:
+            self.rows += len(primary)
+            self.sum_abs_diff += float(abs_diff.sum())
+            self.sum_sq_diff += float(np.dot(abs_diff, abs_diff))
+            self.sum_rel_diff += float(rel_diff.sum())
+            self.max_abs_diff = max(self.max_abs_diff, float(abs_diff.max()))
+            for tolerance in AGREEMENT_TOLERANCES:
+                self.within[tolerance] += int((rel_diff <= tolerance).sum())
+
+    def reset(self):
+        with self._lock:
+            self._reset_counters()
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self.rows
+            disagreement = None
+            if rows:
+                disagreement = {
+                    "mean_abs_diff": self.sum_abs_diff / rows,
+                    "rmse_diff": float(np.sqrt(self.sum_sq_diff / rows)),
+                    "max_abs_diff": self.max_abs_diff,
+                    "mean_rel_diff": self.sum_rel_diff / rows,
+                    **{f"within_{int(t * 100)}pct": self.within[t] / rows for t in AGREEMENT_TOLERANCES},
+                }
+            return {
+                "shadow_model_version": self.shadow_model_version,
+                "shadow_process_alive": self._process is not None and self._process.is_alive(),
+                "sample_rate": self.sample_rate,
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "dropped_rows": self.dropped_rows,
+                "errors": self.errors,
+                "pending_rows": self._pending_rows,
+                "scored_rows": rows,
+                "disagreement": disagreement,
+                "latency_ms_per_row": {
+                    "primary": self.primary_latency_ms.snapshot(),
+                    "shadow": self.shadow_latency_ms.snapshot(),
+                },
+            }
@@ -0,0 +1,201 @@
+"""
+Latency and throughput benchmark for the prediction API (api/main.py).
+
+Drives the app either in-process (ASGI, no network) or against local uvicorn
+servers with different worker counts, and reports p50/p95/p99 latency and
+throughput for single /predict calls, /predict/batch calls and cold-start model
+load. Results are written as JSON so runs can be compared for regressions.
+
+    pip install httpx numpy
+    python benchmark_api.py --model-path ./model/model.pkl --mode uvicorn --workers 1,2,4 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api")
+
+SAMPLE_ROW = {
+    "longitude": -122.23,
+    "latitude": 37.88,
+    "housing_median_age": 41.0,
+    "total_rooms": 880.0,
+    "total_bedrooms": 129.0,
+    "population": 322.0,
+    "households": 126.0,
+    "median_income": 8.3252,
+    "ocean_proximity": "NEAR BAY",
+}
+
+def make_row(i: int) -> dict:
+    # Vary the income so an enabled prediction cache does not turn the run into cache hits.
+    return dict(SAMPLE_ROW, median_income=SAMPLE_ROW["median_income"] + (i % 10_000) * 1e-4)
+
+def summarize(latencies_s, wall_s, rows_per_request=1, errors=0) -> dict:
+    latencies_ms = np.asarray(latencies_s) * 1000
+    return {
+        "requests": len(latencies_s),
+        "errors": errors,
+        "latency_ms": {
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+            "mean": float(latencies_ms.mean()),
+            "max": float(latencies_ms.max()),
+        },
+        "throughput_rps": len(latencies_s) / wall_s,
+        "rows_per_s": len(latencies_s) * rows_per_request / wall_s,
+    }
+
+async def run_load(client: httpx.AsyncClient, path: str, payloads, concurrency: int, rows_per_request: int = 1) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(payload):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(path, json=payload)
+            elapsed = time.perf_counter() - start
+            if response.status_code == 200:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    # Warm-up outside the measured window (first-call imports, thread pool spin-up).
+    await asyncio.gather(*(one(p) for p in payloads[:min(len(payloads), concurrency)]))
+    latencies.clear()
+    errors = 0
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in payloads))
+    wall = time.perf_counter() - start
+    if not latencies:
+        raise RuntimeError(f"Every request to {path} failed; is a model deployed?")
+    return summarize(latencies, wall, rows_per_request, errors)
+
+async def run_scenarios(client: httpx.AsyncClient, args) -> dict:
+    single = [make_row(i) for i in range(args.requests)]
+    n_batches = max(1, args.requests // 10)
+    batches = [[make_row(i * args.batch_size + j) for j in range(args.batch_size)] for i in range(n_batches)]
+    return {
+        "predict": await run_load(client, "/predict", single, args.concurrency),
+        "predict_batch": await run_load(client, "/predict/batch", batches, args.concurrency, args.batch_size),
+    }
+
+def bench_cold_start_inprocess(main, repeats: int) -> dict:
+    """Times a full model load into a fresh ModelStore, as happens at worker startup."""
+    latencies = []
+    for _ in range(repeats):
+        store = main.ModelStore(main.MODEL_PATH, main.MODEL_METADATA_PATH, main._load_model)
+        start = time.perf_counter()
+        store.reload(force=True)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, sum(latencies))
+
+async def bench_inprocess(args) -> list:
+    sys.path.insert(0, API_DIR)
+    import main
+
+    # ASGITransport does not run lifespan events, so start the app explicitly.
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            results = await run_scenarios(client, args)
+        results["cold_start"] = bench_cold_start_inprocess(main, args.cold_start_repeats)
+    return [{"mode": "inprocess", "workers": 1, "scenarios": results}]
+
+def start_uvicorn(workers: int, port: int, env: dict):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=API_DIR, env=env,
+    )
+
+async def wait_until_ready(base_url: str, timeout_s: float) -> float:
+    """Returns seconds until /health reports a loaded model."""
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() - start < timeout_s:
+            try:
+                response = await client.get("/health")
+                if response.status_code == 200 and response.json().get("status") == "OK":
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.02)
+    raise TimeoutError(f"API at {base_url} was not ready after {timeout_s}s")
+
+async def bench_uvicorn(args) -> list:
+    env = dict(os.environ, MODEL_PATH=os.path.abspath(args.model_path))
+    runs = []
+    for workers in args.workers:
+        cold_starts = []
+        for _ in range(args.cold_start_repeats):
+            process = start_uvicorn(workers, args.port, env)
+            try:
+                cold_starts.append(await wait_until_ready(f"http://127.0.0.1:{args.port}", args.ready_timeout))
+            finally:
+                process.terminate()
+                process.wait()
+
+        process = start_uvicorn(workers, args.port, env)
+        try:
+            await wait_until_ready(f"http://127.0.0.1:{args.port}", args.ready_timeout)
+            limits = httpx.Limits(max_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+                results = await run_scenarios(client, args)
+        finally:
+            process.terminate()
+            process.wait()
+        results["cold_start"] = summarize(cold_starts, sum(cold_starts))
+        runs.append({"mode": "uvicorn", "workers": workers, "scenarios": results})
+    return runs
+
+def print_report(runs):
+    print(f"{'mode':<10} {'workers':>7} {'scenario':<14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>10} {'rows/s':>11}")
+    for run in runs:
+        for name, r in run["scenarios"].items():
+            lat = r["latency_ms"]
+            print(f"{run['mode']:<10} {run['workers']:>7} {name:<14} {lat['p50']:>9.2f} {lat['p95']:>9.2f} {lat['p99']:>9.2f} "
+                  f"{r['throughput_rps']:>10.1f} {r['rows_per_s']:>11.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", default=os.environ.get("MODEL_PATH", "/app/model/model.pkl"))
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", default="1", help="Comma-separated uvicorn worker counts (uvicorn mode).")
+    parser.add_argument("--requests", type=int, default=2000, help="Single-row requests per run; batch runs send a tenth as many.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--cold-start-repeats", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ready-timeout", type=float, default=120)
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+    args.workers = [int(w) for w in args.workers.split(",")]
+
+    os.environ["MODEL_PATH"] = os.path.abspath(args.model_path)
+    runs = asyncio.run(bench_inprocess(args) if args.mode == "inprocess" else bench_uvicorn(args))
+    print_report(runs)
+
+    if args.output:
+        report = {
+            "timestamp": time.time(),
+            "host": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            "runs": runs,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -14,10 +14,15 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + '/../scripts')
 
 from _03_model_training import train_model
 from _04_model_evaluation import evaluate_model
-from _05_model_deployment import deploy_best_model
+from _05_model_deployment import deploy_best_model, deploy_shadow_model
 
 SPARK_MASTER = "spark://spark-master:7077"
 PROCESSED_DATA_PATH_BASE = "/opt/airflow/processed_data"
+# Run ingestion and feature engineering as one Spark job (one session, no intermediate parquet).
+# Set ML_PIPELINE_FUSED_SPARK_JOB=false to run the two steps as separate jobs.
+FUSED_SPARK_JOB = os.environ.get("ML_PIPELINE_FUSED_SPARK_JOB", "true").lower() == "true"
+# "shadow" writes the Staging model to the API's shadow slot instead of promoting it to Production.
+DEPLOY_MODE = os.environ.get("ML_PIPELINE_DEPLOY_MODE", "production")
 
 with DAG(
     dag_id='ml_pipeline_orchestration',
@@ -34,31 +39,49 @@ with DAG(
         bash_command='echo "Starting ML Pipeline..."',
     )
     
-    data_ingestion = BashOperator(
-        task_id='data_ingestion_spark',
-        bash_command=(
-            f"spark-submit --master {SPARK_MASTER} "
-            "/opt/airflow/scripts/01_data_ingestion.py "
-            "--input_path /opt/airflow/data/housing.csv "
-            f"--output_path {PROCESSED_DATA_PATH_BASE}/ingested_data"
+    if FUSED_SPARK_JOB:
+        data_preparation = BashOperator(
+            task_id='ingestion_and_feature_engineering_spark',
+            bash_command=(
+                f"spark-submit --master {SPARK_MASTER} "
+                "/opt/airflow/scripts/01_02_ingest_and_featurize.py "
+                "--input_path /opt/airflow/data "
+                f"--output_path {PROCESSED_DATA_PATH_BASE}/featured_data "
+                "--incremental"
+            )
+        )
+        spark_tasks = [data_preparation]
+    else:
+        data_ingestion = BashOperator(
+            task_id='data_ingestion_spark',
+            bash_command=(
+                f"spark-submit --master {SPARK_MASTER} "
+                "/opt/airflow/scripts/01_data_ingestion.py "
+                "--input_path /opt/airflow/data "
+                f"--output_path {PROCESSED_DATA_PATH_BASE}/ingested_data "
+                "--incremental"
+            )
         )
-    )
 
-    feature_engineering = BashOperator(
-        task_id='feature_engineering_spark',
-        bash_command=(
-            f"spark-submit --master {SPARK_MASTER} "
-            "/opt/airflow/scripts/02_feature_engineering.py "
-            f"--input_path {PROCESSED_DATA_PATH_BASE}/ingested_data "
-            f"--output_path {PROCESSED_DATA_PATH_BASE}/featured_data"
+        feature_engineering = BashOperator(
+            task_id='feature_engineering_spark',
+            bash_command=(
+                f"spark-submit --master {SPARK_MASTER} "
+                "/opt/airflow/scripts/02_feature_engineering.py "
+                f"--input_path {PROCESSED_DATA_PATH_BASE}/ingested_data "
+                f"--output_path {PROCESSED_DATA_PATH_BASE}/featured_data"
+            )
         )
-    )
+        data_ingestion >> feature_engineering
+        spark_tasks = [data_ingestion, feature_engineering]
 
     model_training = PythonOperator(
         task_id='model_training',
         python_callable=train_model,
         op_kwargs={
-            'spark_path': f'file://{PROCESSED_DATA_PATH_BASE}/featured_data'
+            'spark_path': f'file://{PROCESSED_DATA_PATH_BASE}/featured_data',
+            # "grid" or "random" runs a parallel hyperparameter search instead of a single fit.
+            'search_mode': os.environ.get("ML_PIPELINE_SEARCH_MODE") or None,
         },
     )
 
@@ -67,17 +90,27 @@ with DAG(
         python_callable=evaluate_model,
     )
     
-    model_deployment = PythonOperator(
-        task_id='model_deployment',
-        python_callable=deploy_best_model,
-        op_kwargs={
-            'output_model_path': '/opt/airflow/model/model.pkl'
-        }
-    )
+    if DEPLOY_MODE == "shadow":
+        model_deployment = PythonOperator(
+            task_id='shadow_model_deployment',
+            python_callable=deploy_shadow_model,
+            op_kwargs={
+                'output_model_path': '/opt/airflow/model/shadow/model.pkl'
+            }
+        )
+    else:
+        model_deployment = PythonOperator(
+            task_id='model_deployment',
+            python_callable=deploy_best_model,
+            op_kwargs={
+                'output_model_path': '/opt/airflow/model/model.pkl'
+            }
+        )
 
     end_pipeline = BashOperator(
         task_id='end_pipeline',
         bash_command='echo "ML Pipeline Finished Successfully!"',
     )
     
-    start_pipeline >> data_ingestion >> feature_engineering >> model_training >> model_evaluation >> model_deployment >> end_pipeline
\ No newline at end of file
+    start_pipeline >> spark_tasks[0]
+    spark_tasks[-1] >> model_training >> model_evaluation >> model_deployment >> end_pipeline
\ No newline at end of file
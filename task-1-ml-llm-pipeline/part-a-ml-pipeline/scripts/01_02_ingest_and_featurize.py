@@ -0,0 +1,42 @@
+import argparse
+import importlib
+from pyspark.sql import SparkSession
+
+# The step scripts start with digits, so they can only be imported by name.
+ingestion = importlib.import_module("01_data_ingestion")
+feature_engineering = importlib.import_module("02_feature_engineering")
+
+def prepare(df):
+    return feature_engineering.add_features(ingestion.clean(df))
+
+def ingest_and_featurize(spark, input_path, output_path):
+    """
+    Runs ingestion and feature engineering as one Spark job: the cleaned data
+    flows straight into the feature columns without the intermediate parquet
+    write/read and the second SparkSession that the separate scripts need.
+    """
+    print(f"Reading data from {input_path}")
+    df_featured = prepare(ingestion.read_raw(spark, input_path))
+    print(f"Writing featured data to {output_path}")
+    df_featured.write.mode("overwrite").parquet(output_path)
+    print("Data ingestion and feature engineering complete.")
+
+def ingest_and_featurize_incremental(spark, input_path, output_path, manifest_path=None):
+    print(f"Incrementally ingesting and featurizing data from {input_path} into {output_path}")
+    ingestion.run_incremental(spark, input_path, output_path, prepare, manifest_path)
+    print("Data ingestion and feature engineering complete.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_path", required=True, help="A CSV file, or a directory of CSV files in incremental mode.")
+    parser.add_argument("--output_path", required=True)
+    parser.add_argument("--incremental", action="store_true", help="Only process input files that are new or changed since the last run.")
+    parser.add_argument("--manifest_path", help=f"Defaults to <output_path>/{ingestion.MANIFEST_FILENAME}.")
+    args = parser.parse_args()
+
+    spark = SparkSession.builder.appName("IngestionAndFeatureEngineering").getOrCreate()
+    if args.incremental:
+        ingest_and_featurize_incremental(spark, args.input_path, args.output_path, args.manifest_path)
+    else:
+        ingest_and_featurize(spark, args.input_path, args.output_path)
+    spark.stop()
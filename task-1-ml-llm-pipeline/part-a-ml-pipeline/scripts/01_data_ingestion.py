@@ -1,20 +1,155 @@
 import argparse
+import glob
+import json
+import os
+import shutil
+from functools import reduce
 from pyspark.sql import SparkSession
+from pyspark.sql.functions import lit
+from pyspark.sql.types import DoubleType, StringType, StructField, StructType
+
+# Explicit schema for housing.csv; avoids the extra full pass that inferSchema makes.
+HOUSING_SCHEMA = StructType([
+    StructField("longitude", DoubleType()),
+    StructField("latitude", DoubleType()),
+    StructField("housing_median_age", DoubleType()),
+    StructField("total_rooms", DoubleType()),
+    StructField("total_bedrooms", DoubleType()),
+    StructField("population", DoubleType()),
+    StructField("households", DoubleType()),
+    StructField("median_income", DoubleType()),
+    StructField("median_house_value", DoubleType()),
+    StructField("ocean_proximity", StringType()),
+])
+
+# Incremental mode partitions the output by the input file each row came from,
+# so a changed file only rewrites its own partition.
+SOURCE_PARTITION_COLUMN = "source_file"
+# Spark ignores files starting with "_" when reading the parquet directory.
+MANIFEST_FILENAME = "_ingest_manifest.json"
+
+def read_raw(spark, input_path):
+    return spark.read.csv(input_path, header=True, schema=HOUSING_SCHEMA)
+
+def clean(df):
+    return df.na.drop()
 
 def ingest_data(spark, input_path, output_path):
     print(f"Reading data from {input_path}")
-    df = spark.read.csv(input_path, header=True, inferSchema=True)
-    df_cleaned = df.na.drop()
+    df = read_raw(spark, input_path)
+    df_cleaned = clean(df)
     print(f"Writing cleaned data to {output_path}")
     df_cleaned.write.mode("overwrite").parquet(output_path)
     print("Data ingestion complete.")
 
+def list_input_files(input_path):
+    if os.path.isdir(input_path):
+        return sorted(glob.glob(os.path.join(input_path, "*.csv")))
+    return [input_path]
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(manifest_path, manifest):
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def plan_incremental(input_path, manifest):
+    """
+    Compares the input files against the manifest of previously ingested files.
+    Returns (changed_files, deleted_files, new_manifest); changed includes new files.
+    """
+    manifest = manifest or {}
+    new_manifest = {}
+    changed = []
+    for path in list_input_files(input_path):
+        name = os.path.basename(path)
+        signature = _file_signature(path)
+        new_manifest[name] = signature
+        if manifest.get(name) != signature:
+            changed.append(path)
+    deleted = sorted(set(manifest) - set(new_manifest))
+    return changed, deleted, new_manifest
+
+def read_tagged(spark, paths):
+    """Reads each file with its name in the source partition column."""
+    frames = [read_raw(spark, path).withColumn(SOURCE_PARTITION_COLUMN, lit(os.path.basename(path))) for path in paths]
+    return reduce(lambda a, b: a.unionByName(b), frames)
+
+def write_partitions(spark, df, output_path, first_run):
+    """
+    Writes only the partitions present in `df`. On the first incremental run the
+    whole output is replaced, so the partitioned layout never mixes with output
+    from a full (unpartitioned) run.
+    """
+    spark.conf.set("spark.sql.sources.partitionOverwriteMode", "static" if first_run else "dynamic")
+    df.write.mode("overwrite").partitionBy(SOURCE_PARTITION_COLUMN).parquet(output_path)
+
+def partition_path(spark, output_path, name):
+    """
+    The directory Spark writes the partition of input file `name` to. Partition
+    values are escaped the way Spark escapes them (`%`, `#`, `:`, `=` and others
+    become `%XX`), so the name is run through Spark's own escaping.
+    """
+    escape = spark.sparkContext._jvm.org.apache.spark.sql.catalyst.catalog.ExternalCatalogUtils.escapePathName
+    return os.path.join(output_path, f"{escape(SOURCE_PARTITION_COLUMN)}={escape(name)}")
+
+def drop_partitions(spark, output_path, names):
+    for name in names:
+        path = partition_path(spark, output_path, name)
+        if os.path.exists(path):
+            print(f"Dropping {path}")
+            shutil.rmtree(path)
+
+def run_incremental(spark, input_path, output_path, transform, manifest_path=None):
+    """
+    Applies `transform` to the new or changed input files only and rewrites their
+    partitions, leaving already ingested partitions untouched. Partitions of
+    changed and deleted files are removed before the write. The manifest is
+    updated only after the write succeeds, so an interrupted run redoes them.
+    """
+    manifest_path = manifest_path or os.path.join(output_path, MANIFEST_FILENAME)
+    manifest = load_manifest(manifest_path)
+    changed, deleted, new_manifest = plan_incremental(input_path, manifest)
+    if not changed and not deleted:
+        print("No new or changed input files. Nothing to ingest.")
+        return
+    if deleted:
+        print(f"Input file(s) removed since the last run: {deleted}")
+    # Dynamic overwrite only replaces partitions the new data writes to: a changed file left with no
+    # rows after `transform` would keep its stale partition. Drop every affected partition first.
+    drop_partitions(spark, output_path, [os.path.basename(p) for p in changed] + deleted)
+    if changed:
+        print(f"Ingesting {len(changed)} new or changed file(s): {[os.path.basename(p) for p in changed]}")
+        write_partitions(spark, transform(read_tagged(spark, changed)), output_path, first_run=manifest is None)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    save_manifest(manifest_path, new_manifest)
+
+def ingest_incremental(spark, input_path, output_path, manifest_path=None):
+    print(f"Incrementally ingesting data from {input_path} into {output_path}")
+    run_incremental(spark, input_path, output_path, clean, manifest_path)
+    print("Data ingestion complete.")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input_path", required=True)
+    parser.add_argument("--input_path", required=True, help="A CSV file, or a directory of CSV files in incremental mode.")
     parser.add_argument("--output_path", required=True)
+    parser.add_argument("--incremental", action="store_true", help="Only ingest input files that are new or changed since the last run.")
+    parser.add_argument("--manifest_path", help=f"Defaults to <output_path>/{MANIFEST_FILENAME}.")
     args = parser.parse_args()
 
     spark = SparkSession.builder.appName("DataIngestion").getOrCreate()
-    ingest_data(spark, args.input_path, args.output_path)
+    if args.incremental:
+        ingest_incremental(spark, args.input_path, args.output_path, args.manifest_path)
+    else:
+        ingest_data(spark, args.input_path, args.output_path)
     spark.stop()
@@ -1,12 +1,20 @@
 import argparse
+import importlib
 from pyspark.sql import SparkSession
 from pyspark.sql.functions import col
 
+# The step scripts start with digits, so they can only be imported by name.
+ingestion = importlib.import_module("01_data_ingestion")
+
+def add_features(df):
+    df_featured = df.withColumn("rooms_per_person", col("total_rooms") / col("population"))
+    return df_featured.withColumn("bedrooms_per_room", col("total_bedrooms") / col("total_rooms"))
+
 def create_features(spark, input_path, output_path):
     print(f"Reading ingested data from {input_path}")
-    df = spark.read.parquet(input_path)
-    df_featured = df.withColumn("rooms_per_person", col("total_rooms") / col("population"))
-    df_featured = df_featured.withColumn("bedrooms_per_room", col("total_bedrooms") / col("total_rooms"))
+    # Incremental ingestion partitions by source file; that column is not a model feature.
+    df = spark.read.parquet(input_path).drop(ingestion.SOURCE_PARTITION_COLUMN)
+    df_featured = add_features(df)
     print(f"Writing featured data to {output_path}")
     df_featured.write.mode("overwrite").parquet(output_path)
     print("Feature engineering complete.")
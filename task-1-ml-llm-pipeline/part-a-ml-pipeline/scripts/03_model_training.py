@@ -1,6 +1,8 @@
+import time
 import mlflow
 import pandas as pd
-from sklearn.model_selection import train_test_split
+from joblib import Parallel, delayed
+from sklearn.model_selection import ParameterGrid, ParameterSampler
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
@@ -8,19 +10,57 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.metrics import mean_squared_error
 import numpy as np
 
+import feature_cache
+
 MLFLOW_TRACKING_URI = "http://mlflow:5000"
 MLFLOW_EXPERIMENT_NAME = "CaliforniaHousing_Prediction"
 MODEL_REGISTRY_NAME = "RandomForestRegressor_Housing"
 
-def train_model(spark_path: str):
-    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
-    mlflow.set_experiment(MLFLOW_EXPERIMENT_NAME)
+# Hyperparameter search space for search_mode="grid" (every combination) or "random" (n_trials samples).
+SEARCH_SPACE = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [8, 10, 14, None],
+    "min_samples_leaf": [1, 2, 4],
+    "max_features": [1.0, 0.5, "sqrt"],
+}
+SEARCH_N_TRIALS = 20
+# Trials run in parallel worker processes, one single-threaded forest each.
+SEARCH_N_JOBS = -1
+# Everything that determines the transformed matrices; part of the feature cache key.
+PREPROCESSING_CONFIG = {
+    "target": "median_house_value",
+    "categorical_features": ["ocean_proximity"],
+    "numerical_scaler": "StandardScaler",
+    "categorical_encoder": "OneHotEncoder(handle_unknown='ignore')",
+    "test_size": 0.2,
+    "holdout_split": "row_hash_v1",
+}
+# Holdout assignment resolution: a row is held out if its hash bucket is below test_size * HOLDOUT_BUCKETS.
+HOLDOUT_BUCKETS = 10_000
+
+def _dense_float32(X):
+    # Trees work in float32; converting once avoids a copy inside every fit.
+    if hasattr(X, "toarray"):
+        X = X.toarray()
+    return np.ascontiguousarray(X, dtype=np.float32)
+
+def _holdout_mask(df):
+    """
+    Assigns each row to the holdout set by a hash of its contents rather than
+    a random split of the current dataset. A row stays on the same side as
+    data is added, so no model trained with this split, including the
+    current Production model, has trained on any holdout row.
+    """
+    buckets = pd.util.hash_pandas_object(df[sorted(df.columns)], index=False).to_numpy() % HOLDOUT_BUCKETS
+    return buckets < int(PREPROCESSING_CONFIG["test_size"] * HOLDOUT_BUCKETS)
 
-    df = pd.read_parquet(spark_path.replace("file://", ""))
-    X = df.drop("median_house_value", axis=1)
-    y = df["median_house_value"]
+def _build_features(data_path: str):
+    # Incremental Spark output is partitioned by source file; that column is not a feature.
+    df = pd.read_parquet(data_path).drop(columns=["source_file"], errors="ignore")
+    X = df.drop(PREPROCESSING_CONFIG["target"], axis=1)
+    y = df[PREPROCESSING_CONFIG["target"]]
 
-    categorical_features = ["ocean_proximity"]
+    categorical_features = PREPROCESSING_CONFIG["categorical_features"]
     numerical_features = X.columns.drop(categorical_features)
 
     preprocessor = ColumnTransformer(
@@ -29,27 +69,119 @@ def train_model(spark_path: str):
             ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features)
         ], remainder='passthrough')
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    in_holdout = _holdout_mask(df)
+    X_train, X_test, y_train, y_test = X[~in_holdout], X[in_holdout], y[~in_holdout], y[in_holdout]
+    Xt_train = _dense_float32(preprocessor.fit_transform(X_train))
+    Xt_test = _dense_float32(preprocessor.transform(X_test))
+    holdout = X_test.assign(**{PREPROCESSING_CONFIG["target"]: y_test})
+    return preprocessor, Xt_train, Xt_test, y_train.to_numpy(), y_test.to_numpy(), holdout
+
+def _prepare_features(spark_path: str) -> feature_cache.PreparedFeatures:
+    """Loads the transformed matrices from the feature cache, building them on a miss."""
+    data_path = spark_path.replace("file://", "")
+    return feature_cache.load_or_build(data_path, PREPROCESSING_CONFIG, lambda: _build_features(data_path))
+
+def _fit_and_score(params, X_train, y_train, X_test, y_test):
+    """Runs in a worker process; the matrices arrive memory-mapped, not copied."""
+    start = time.time()
+    regressor = RandomForestRegressor(random_state=42, n_jobs=1, **params)
+    regressor.fit(X_train, y_train)
+    rmse = np.sqrt(mean_squared_error(y_test, regressor.predict(X_test)))
+    return params, rmse, time.time() - start
+
+def train_model(spark_path: str, search_mode: str = None, n_trials: int = SEARCH_N_TRIALS):
+    if search_mode:
+        return search_model(spark_path, search_mode, n_trials)
+
+    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+    mlflow.set_experiment(MLFLOW_EXPERIMENT_NAME)
+
+    features = _prepare_features(spark_path)
 
     with mlflow.start_run() as run:
         print("Starting MLflow run...")
         n_estimators, max_depth = 100, 10
-        mlflow.log_params({"n_estimators": n_estimators, "max_depth": max_depth})
+        mlflow.log_params({
+            "n_estimators": n_estimators,
+            "max_depth": max_depth,
+            "feature_cache_key": features.key,
+            "holdout_path": features.holdout_path,
+            "holdout_split": PREPROCESSING_CONFIG["holdout_split"],
+        })
 
+        print("Training model...")
+        regressor = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth, random_state=42, n_jobs=-1)
+        regressor.fit(features.X_train, features.y_train)
+        # The preprocessor is already fitted, so the pipeline serves raw rows as before.
         rf_pipeline = Pipeline(steps=[
-            ('preprocessor', preprocessor),
-            ('regressor', RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth, random_state=42, n_jobs=-1))
+            ('preprocessor', features.preprocessor),
+            ('regressor', regressor)
         ])
 
-        print("Training model...")
-        rf_pipeline.fit(X_train, y_train)
+        predictions = regressor.predict(features.X_test)
+        rmse = np.sqrt(mean_squared_error(features.y_test, predictions))
 
-        predictions = rf_pipeline.predict(X_test)
-        rmse = np.sqrt(mean_squared_error(y_test, predictions))
-        
         print(f"RMSE: {rmse}")
         mlflow.log_metric("rmse", rmse)
-        
+
+        mlflow.sklearn.log_model(
+            sk_model=rf_pipeline,
+            artifact_path="model",
+            registered_model_name=MODEL_REGISTRY_NAME
+        )
+        print(f"Model logged to MLflow with name: {MODEL_REGISTRY_NAME}")
+
+def search_model(spark_path: str, search_mode: str = "random", n_trials: int = SEARCH_N_TRIALS):
+    """
+    Evaluates many RandomForest configurations in parallel and registers the best.
+
+    The transformed float32 matrices come from the feature cache as read-only
+    memory maps, which joblib hands to every worker by file reference instead
+    of pickling a copy per trial. Each trial is logged as a nested MLflow run under one
+    parent run, which holds the registered best model and its `rmse`.
+    """
+    if search_mode == "grid":
+        candidates = list(ParameterGrid(SEARCH_SPACE))
+    elif search_mode == "random":
+        candidates = list(ParameterSampler(SEARCH_SPACE, n_iter=n_trials, random_state=42))
+    else:
+        raise ValueError(f"Unknown search_mode '{search_mode}'. Use 'grid' or 'random'.")
+
+    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+    mlflow.set_experiment(MLFLOW_EXPERIMENT_NAME)
+
+    features = _prepare_features(spark_path)
+
+    with mlflow.start_run() as run:
+        print(f"Starting {search_mode} search over {len(candidates)} configurations...")
+        mlflow.log_params({
+            "search_mode": search_mode,
+            "n_trials": len(candidates),
+            "feature_cache_key": features.key,
+            "holdout_path": features.holdout_path,
+            "holdout_split": PREPROCESSING_CONFIG["holdout_split"],
+        })
+
+        results = Parallel(n_jobs=SEARCH_N_JOBS)(
+            delayed(_fit_and_score)(params, features.X_train, features.y_train, features.X_test, features.y_test)
+            for params in candidates
+        )
+
+        for i, (params, rmse, fit_seconds) in enumerate(results):
+            with mlflow.start_run(run_name=f"trial-{i}", nested=True):
+                mlflow.log_params(params)
+                mlflow.log_metrics({"rmse": rmse, "fit_seconds": fit_seconds})
+
+        best_params, best_rmse, _ = min(results, key=lambda result: result[1])
+        print(f"Best configuration {best_params} with RMSE: {best_rmse}")
+
+        # Refit the winner on the shared matrix; the seed makes it identical to its trial.
+        regressor = RandomForestRegressor(random_state=42, n_jobs=-1, **best_params).fit(features.X_train, features.y_train)
+        rf_pipeline = Pipeline(steps=[('preprocessor', features.preprocessor), ('regressor', regressor)])
+
+        mlflow.log_params({f"best_{name}": value for name, value in best_params.items()})
+        mlflow.log_metric("rmse", best_rmse)
+
         mlflow.sklearn.log_model(
             sk_model=rf_pipeline,
             artifact_path="model",
@@ -1,12 +1,84 @@
 import mlflow
+import numpy as np
+import pyarrow.dataset as ds
 from mlflow.tracking import MlflowClient
 
 MLFLOW_TRACKING_URI = "http://mlflow:5000"
 MODEL_NAME = "RandomForestRegressor_Housing"
+TARGET_COLUMN = "median_house_value"
 
-def evaluate_model():
+# Absolute RMSE bar, used when there is no Production model to compare against.
+RMSE_THRESHOLD = 60000
+# Holdout split that training logs with each run; only models sharing it never trained on the holdout rows.
+HOLDOUT_SPLIT = "row_hash_v1"
+# Rows scored per model call; bounds memory regardless of holdout size.
+HOLDOUT_BATCH_SIZE = 50_000
+ERROR_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+# Absolute-error histogram: one bin for [0, 1) plus geometric bins up to 1e7
+# (~0.4% wide), so quantiles come out of one pass in constant memory.
+ERROR_BIN_EDGES = np.concatenate([[0.0], np.geomspace(1.0, 1e7, 4001), [np.inf]])
+
+class StreamingErrorStats:
+    """Accumulates RMSE, MAE, max and approximate absolute-error quantiles batch by batch."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum_squared_error = 0.0
+        self.sum_absolute_error = 0.0
+        self.max_absolute_error = 0.0
+        self.histogram = np.zeros(len(ERROR_BIN_EDGES) - 1, dtype=np.int64)
+
+    def update(self, y_true, y_pred):
+        errors = np.abs(np.asarray(y_pred, dtype=np.float64) - np.asarray(y_true, dtype=np.float64))
+        self.count += errors.size
+        self.sum_squared_error += float(np.dot(errors, errors))
+        self.sum_absolute_error += float(errors.sum())
+        if errors.size:
+            self.max_absolute_error = max(self.max_absolute_error, float(errors.max()))
+        self.histogram += np.histogram(errors, bins=ERROR_BIN_EDGES)[0]
+
+    def _quantile(self, q):
+        cumulative = np.cumsum(self.histogram)
+        target = q * self.count
+        index = int(np.searchsorted(cumulative, target))
+        lower, upper = ERROR_BIN_EDGES[index], min(ERROR_BIN_EDGES[index + 1], self.max_absolute_error)
+        before = cumulative[index - 1] if index > 0 else 0
+        fraction = (target - before) / max(self.histogram[index], 1)
+        return float(lower + (upper - lower) * fraction)
+
+    def result(self) -> dict:
+        if self.count == 0:
+            raise ValueError("No holdout rows were scored.")
+        metrics = {
+            "rmse": float(np.sqrt(self.sum_squared_error / self.count)),
+            "mae": self.sum_absolute_error / self.count,
+            "max_abs_error": self.max_absolute_error,
+            "n_rows": self.count,
+        }
+        for q in ERROR_QUANTILES:
+            metrics[f"p{int(q * 100)}_abs_error"] = self._quantile(q)
+        return metrics
+
+def score_models(models: dict, holdout_path: str, batch_size: int = HOLDOUT_BATCH_SIZE) -> dict:
+    """
+    Streams the holdout parquet in record batches and scores every model on each
+    batch, so all models see exactly the same rows in one pass over the data.
+    """
+    stats = {name: StreamingErrorStats() for name in models}
+    for batch in ds.dataset(holdout_path, format="parquet").to_batches(batch_size=batch_size):
+        frame = batch.to_pandas()
+        y_true = frame.pop(TARGET_COLUMN).to_numpy()
+        for name, model in models.items():
+            stats[name].update(y_true, model.predict(frame))
+    return {name: s.result() for name, s in stats.items()}
+
+def _threshold_decision(rmse):
+    return rmse < RMSE_THRESHOLD, f"RMSE {rmse:.2f} vs threshold {RMSE_THRESHOLD}"
+
+def evaluate_model(holdout_path: str = None):
     client = MlflowClient(tracking_uri=MLFLOW_TRACKING_URI)
-    
+    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+
     try:
         latest_versions = client.get_latest_versions(name=MODEL_NAME, stages=["None"])
         if not latest_versions:
@@ -15,21 +87,50 @@ def evaluate_model():
 
         latest_model = latest_versions[0]
         run_id = latest_model.run_id
-        
+
         print(f"Evaluating model version {latest_model.version} from run {run_id}")
-        
+
         run_data = client.get_run(run_id).data
-        rmse = run_data.metrics.get("rmse")
+        # Training records where its holdout rows were stored.
+        holdout_path = holdout_path or run_data.params.get("holdout_path")
 
-        if rmse is None:
-            raise ValueError("RMSE metric not found for the latest model run.")
+        if holdout_path:
+            models = {"candidate": mlflow.sklearn.load_model(f"models:/{MODEL_NAME}/{latest_model.version}")}
+            production_versions = client.get_latest_versions(name=MODEL_NAME, stages=["Production"])
+            if production_versions:
+                production = production_versions[0]
+                production_split = client.get_run(production.run_id).data.params.get("holdout_split")
+                if production_split == HOLDOUT_SPLIT and run_data.params.get("holdout_split") == HOLDOUT_SPLIT:
+                    print(f"Comparing against Production version {production.version}")
+                    models["production"] = mlflow.sklearn.load_model(f"models:/{MODEL_NAME}/{production.version}")
+                else:
+                    # Its RMSE would include rows it was trained on and look optimistic.
+                    print(f"Production version {production.version} was not trained with the '{HOLDOUT_SPLIT}' "
+                          "holdout split; using the RMSE threshold instead of comparing.")
+
+            results = score_models(models, holdout_path)
+            for name, metrics in results.items():
+                print(f"{name} holdout metrics: {metrics}")
+            for key, value in results["candidate"].items():
+                client.log_metric(run_id, f"holdout_{key}", value)
+
+            candidate_rmse = results["candidate"]["rmse"]
+            if "production" in results:
+                production_rmse = results["production"]["rmse"]
+                promote = candidate_rmse < production_rmse
+                reason = f"Holdout RMSE {candidate_rmse:.2f} vs Production {production_rmse:.2f}"
+            else:
+                promote, reason = _threshold_decision(candidate_rmse)
+        else:
+            # Runs logged before holdouts were stored only have their training metric.
+            rmse = run_data.metrics.get("rmse")
+            if rmse is None:
+                raise ValueError("RMSE metric not found for the latest model run.")
+            print(f"No holdout set recorded; using model RMSE from training run: {rmse}")
+            promote, reason = _threshold_decision(rmse)
 
-        print(f"Model RMSE from training run: {rmse}")
-        
-        # Simple evaluation: If RMSE is below a threshold, transition to Staging
-        threshold = 60000 
-        if rmse < threshold:
-            print(f"RMSE {rmse:.2f} is below threshold {threshold}. Transitioning model to Staging.")
+        if promote:
+            print(f"{reason}: candidate wins. Transitioning model to Staging.")
             client.transition_model_version_stage(
                 name=MODEL_NAME,
                 version=latest_model.version,
@@ -37,7 +138,7 @@ def evaluate_model():
                 archive_existing_versions=True
             )
         else:
-            print(f"RMSE {rmse:.2f} exceeds threshold {threshold}. Archiving model.")
+            print(f"{reason}: candidate does not win. Archiving model.")
             client.transition_model_version_stage(
                 name=MODEL_NAME,
                 version=latest_model.version,
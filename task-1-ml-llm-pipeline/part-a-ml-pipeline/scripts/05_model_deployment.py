@@ -1,10 +1,161 @@
 import mlflow
 from mlflow.tracking import MlflowClient
 import pickle
+import json
 import os
+import time
+import numpy as np
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
 
 MLFLOW_TRACKING_URI = "http://mlflow:5000"
 MODEL_NAME = "RandomForestRegressor_Housing"
+# The prediction API watches this file (next to the model) to report the version it serves.
+MODEL_METADATA_FILENAME = "model_metadata.json"
+# Flattened, NumPy-only export of the pipeline that the API prefers over the pickle.
+COMPILED_MODEL_FILENAME = "model_compiled.bin"
+# Layout: magic, little-endian uint64 header length, JSON header, then raw arrays.
+COMPILED_MODEL_MAGIC = b"HOUSEMDL"
+COMPILED_MODEL_ALIGNMENT = 64
+
+def _atomic_write(path: str, write_fn, mode: str = "wb"):
+    """
+    Writes to a temporary file in the same directory and renames it over `path`,
+    so the API's model watcher never observes a partially written artifact.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f_out:
+        write_fn(f_out)
+        f_out.flush()
+        os.fsync(f_out.fileno())
+    os.replace(tmp_path, path)
+
+def _flatten_preprocessor(preprocessor):
+    """
+    Extracts scaler constants and category-to-column maps from the fitted
+    ColumnTransformer. Only the StandardScaler + OneHotEncoder layout produced
+    by the training step is supported.
+    """
+    numerical_features, scaler_mean, scaler_scale = [], None, None
+    categorical_features, categories = [], []
+    for name, transformer, columns in preprocessor.transformers_:
+        if transformer == "drop" or len(columns) == 0:
+            continue
+        if isinstance(transformer, StandardScaler):
+            numerical_features = list(columns)
+            n = len(numerical_features)
+            scaler_mean = transformer.mean_ if transformer.with_mean else np.zeros(n)
+            scaler_scale = transformer.scale_ if transformer.with_std else np.ones(n)
+        elif isinstance(transformer, OneHotEncoder):
+            if transformer.drop is not None or getattr(transformer, "infrequent_categories_", None) is not None:
+                raise ValueError("OneHotEncoder with 'drop' or infrequent categories cannot be compiled.")
+            categorical_features = list(columns)
+            categories = [[str(c) for c in cats] for cats in transformer.categories_]
+        else:
+            raise ValueError(f"Transformer '{name}' ({type(transformer).__name__}) cannot be compiled.")
+    if scaler_mean is None:
+        raise ValueError("No StandardScaler found in the preprocessor.")
+    return numerical_features, scaler_mean, scaler_scale, categorical_features, categories
+
+def _flatten_forest(forest):
+    """
+    Concatenates every tree's node arrays into flat arrays with global node ids.
+    Leaves point to themselves, so a fixed number of descent steps always ends on a leaf.
+    """
+    lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count) + offset
+        is_leaf = tree.children_left == -1
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+        rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        values.append(tree.value[:, 0, 0])
+        roots.append(offset)
+        offset += tree.node_count
+    return {
+        "children_left": np.concatenate(lefts).astype(np.int64),
+        "children_right": np.concatenate(rights).astype(np.int64),
+        "feature": np.concatenate(features).astype(np.int64),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "value": np.concatenate(values).astype(np.float64),
+        "roots": np.asarray(roots, dtype=np.int64),
+        "max_depth": max(estimator.tree_.max_depth for estimator in forest.estimators_),
+    }
+
+def _write_flat_arrays(f_out, meta: dict, arrays: dict):
+    """
+    Writes arrays back to back at aligned offsets behind a JSON header that
+    records each array's dtype, shape and offset, so readers can mmap the file
+    and view the arrays in place without copying or unpickling.
+    """
+    arrays = {name: np.ascontiguousarray(a, dtype=a.dtype.newbyteorder("<")) for name, a in arrays.items()}
+    descriptors, offset = {}, 0
+    for name, array in arrays.items():
+        descriptors[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // COMPILED_MODEL_ALIGNMENT) * COMPILED_MODEL_ALIGNMENT
+    header = json.dumps(dict(meta, arrays=descriptors)).encode("utf-8")
+    # Pad the header so the data section starts on an aligned boundary.
+    data_start = -(-(len(COMPILED_MODEL_MAGIC) + 8 + len(header)) // COMPILED_MODEL_ALIGNMENT) * COMPILED_MODEL_ALIGNMENT
+    header += b" " * (data_start - len(COMPILED_MODEL_MAGIC) - 8 - len(header))
+    f_out.write(COMPILED_MODEL_MAGIC)
+    f_out.write(len(header).to_bytes(8, "little"))
+    f_out.write(header)
+    for name, array in arrays.items():
+        f_out.seek(data_start + descriptors[name]["offset"])
+        f_out.write(array.tobytes())
+
+def export_compiled_model(pipeline, output_path: str):
+    """
+    Flattens the fitted preprocessing + RandomForest pipeline into plain arrays
+    (scaler constants, category maps and node arrays) for the API's NumPy engine.
+    The file is memory-mapped read-only by every API worker, so the tree arrays
+    are shared through the page cache instead of being unpickled per process.
+    """
+    preprocessor = pipeline.named_steps["preprocessor"]
+    numerical, mean, scale, categorical, categories = _flatten_preprocessor(preprocessor)
+    forest = _flatten_forest(pipeline.named_steps["regressor"])
+    meta = {
+        "format_version": 2,
+        "numerical_features": numerical,
+        "categorical_features": categorical,
+        "categories": categories,
+        "max_depth": forest.pop("max_depth"),
+    }
+    arrays = dict(forest, scaler_mean=np.asarray(mean, dtype=np.float64), scaler_scale=np.asarray(scale, dtype=np.float64))
+    _atomic_write(output_path, lambda f_out: _write_flat_arrays(f_out, meta, arrays))
+
+def _write_model_artifacts(loaded_model, model_version, output_model_path: str):
+    """Writes the compiled export, the pickle and the metadata file the API watches, in that order."""
+    # Ensure output directory exists
+    os.makedirs(os.path.dirname(output_model_path), exist_ok=True)
+
+    # Written before the pickle so the API never pairs a new pickle with an old export.
+    # The compiled export is an optimization: if the pipeline cannot be flattened,
+    # remove any stale export so the API falls back to the pickle for this version.
+    compiled_model_path = os.path.join(os.path.dirname(output_model_path), COMPILED_MODEL_FILENAME)
+    try:
+        export_compiled_model(loaded_model, compiled_model_path)
+        print(f"Compiled model exported to {compiled_model_path}")
+    except Exception as e:
+        print(f"Skipping compiled model export: {e}")
+        if os.path.exists(compiled_model_path):
+            os.remove(compiled_model_path)
+
+    # Save the model to the shared volume for the API
+    _atomic_write(output_model_path, lambda f_out: pickle.dump(loaded_model, f_out))
+
+    print(f"Model successfully saved to {output_model_path}")
+
+    metadata = {
+        "name": MODEL_NAME,
+        "version": model_version.version,
+        "run_id": model_version.run_id,
+        "deployed_at": time.time(),
+    }
+    metadata_path = os.path.join(os.path.dirname(output_model_path), MODEL_METADATA_FILENAME)
+    _atomic_write(metadata_path, lambda f_out: json.dump(metadata, f_out), mode="w")
 
 def deploy_best_model(output_model_path: str):
     client = MlflowClient(tracking_uri=MLFLOW_TRACKING_URI)
@@ -23,14 +174,7 @@ def deploy_best_model(output_model_path: str):
         model_uri = f"models:/{MODEL_NAME}/Staging"
         loaded_model = mlflow.sklearn.load_model(model_uri)
         
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_model_path), exist_ok=True)
-        
-        # Save the model to the shared volume for the API
-        with open(output_model_path, "wb") as f_out:
-            pickle.dump(loaded_model, f_out)
-        
-        print(f"Model successfully saved to {output_model_path}")
+        _write_model_artifacts(loaded_model, model_to_deploy, output_model_path)
 
         # Transition the model to Production in the registry
         print(f"Transitioning model version {model_to_deploy.version} to Production.")
@@ -45,3 +189,26 @@ def deploy_best_model(output_model_path: str):
     except Exception as e:
         print(f"An error occurred during model deployment: {e}")
         raise
+
+def deploy_shadow_model(output_model_path: str):
+    """
+    Writes the Staging model to the API's shadow location (SHADOW_MODEL_PATH)
+    without touching the registry stages, so it can be compared against the
+    serving model on live traffic before `deploy_best_model` promotes it.
+    """
+    client = MlflowClient(tracking_uri=MLFLOW_TRACKING_URI)
+
+    try:
+        staged_versions = client.get_latest_versions(name=MODEL_NAME, stages=["Staging"])
+        if not staged_versions:
+            print(f"No models in 'Staging' for '{MODEL_NAME}'. Shadow deployment skipped.")
+            return
+
+        shadow_version = staged_versions[0]
+        print(f"Deploying Staging model version {shadow_version.version} as the shadow model.")
+        loaded_model = mlflow.sklearn.load_model(f"models:/{MODEL_NAME}/{shadow_version.version}")
+        _write_model_artifacts(loaded_model, shadow_version, output_model_path)
+
+    except Exception as e:
+        print(f"An error occurred during shadow model deployment: {e}")
+        raise
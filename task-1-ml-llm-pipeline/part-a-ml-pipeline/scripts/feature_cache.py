@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import uuid
+from typing import Any, NamedTuple
+
+import numpy as np
+import sklearn
+
+FEATURE_CACHE_DIR = os.environ.get("FEATURE_CACHE_DIR", "/opt/airflow/processed_data/feature_cache")
+# Older entries beyond this count are pruned after each new build.
+FEATURE_CACHE_MAX_ENTRIES = int(os.environ.get("FEATURE_CACHE_MAX_ENTRIES", "5"))
+
+# Bump when the layout of a cache entry changes so stale entries are never loaded.
+CACHE_FORMAT_VERSION = 2
+ARRAY_NAMES = ("X_train", "X_test", "y_train", "y_test")
+PREPROCESSOR_FILENAME = "preprocessor.pkl"
+# Untransformed test rows (features + target), used to score full pipelines in evaluation.
+HOLDOUT_FILENAME = "holdout.parquet"
+
+class PreparedFeatures(NamedTuple):
+    key: str
+    preprocessor: Any  # fitted ColumnTransformer
+    X_train: np.ndarray
+    X_test: np.ndarray
+    y_train: np.ndarray
+    y_test: np.ndarray
+    holdout_path: str
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_parquet(path: str) -> str:
+    """
+    Hashes the contents of a parquet file or directory. Spark names part files
+    with a random UUID on every write, so files are identified by content and
+    partition directory rather than by name; metadata files ("_", ".") are skipped.
+    """
+    if os.path.isfile(path):
+        return _file_digest(path)
+    entries = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith(("_", "."))]
+        for name in files:
+            if name.startswith(("_", ".")):
+                continue
+            entries.append((os.path.relpath(root, path), _file_digest(os.path.join(root, name))))
+    return hashlib.sha256(json.dumps(sorted(entries)).encode("utf-8")).hexdigest()
+
+def cache_key(data_path: str, config: dict) -> str:
+    fingerprint = {
+        "data": hash_parquet(data_path),
+        "config": config,
+        "sklearn": sklearn.__version__,
+        "format": CACHE_FORMAT_VERSION,
+    }
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _load(entry_dir: str, key: str) -> PreparedFeatures:
+    with open(os.path.join(entry_dir, PREPROCESSOR_FILENAME), "rb") as f:
+        preprocessor = pickle.load(f)
+    arrays = {name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode="r") for name in ARRAY_NAMES}
+    return PreparedFeatures(key=key, preprocessor=preprocessor, holdout_path=os.path.join(entry_dir, HOLDOUT_FILENAME), **arrays)
+
+def _prune(cache_dir: str, keep: str):
+    entries = [os.path.join(cache_dir, d) for d in os.listdir(cache_dir) if not d.startswith(".")]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for entry in entries[FEATURE_CACHE_MAX_ENTRIES:]:
+        if os.path.basename(entry) != keep:
+            shutil.rmtree(entry, ignore_errors=True)
+
+def load_or_build(data_path: str, config: dict, build_fn, cache_dir: str = FEATURE_CACHE_DIR) -> PreparedFeatures:
+    """
+    Returns the transformed train/test matrices for `data_path`, keyed by the
+    data's content hash and the preprocessing `config`.
+
+    On a hit the `.npy` files are memory-mapped read-only, so training and the
+    search workers read them without copying. On a miss `build_fn()` must return
+    (fitted_preprocessor, X_train, X_test, y_train, y_test, holdout_frame), where
+    `holdout_frame` holds the raw test rows with their target. The result is written
+    to a temporary directory and renamed into place so readers never see a
+    partial entry.
+    """
+    key = cache_key(data_path, config)
+    entry_dir = os.path.join(cache_dir, key)
+    if os.path.isdir(entry_dir):
+        print(f"Feature cache hit: {entry_dir}")
+        return _load(entry_dir, key)
+
+    print(f"Feature cache miss for {data_path}; building features.")
+    preprocessor, *arrays, holdout = build_fn()
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = os.path.join(cache_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    try:
+        for name, array in zip(ARRAY_NAMES, arrays):
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_dir, PREPROCESSOR_FILENAME), "wb") as f:
+            pickle.dump(preprocessor, f)
+        holdout.to_parquet(os.path.join(tmp_dir, HOLDOUT_FILENAME), index=False)
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # Another run built the same entry concurrently; use theirs.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(entry_dir):
+            raise
+    _prune(cache_dir, keep=key)
+    return _load(entry_dir, key)
@@ -0,0 +1,58 @@
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "api"))
+
+from compiled_model import CompiledModel  # noqa: E402
+
+# The deployment script imports mlflow at the top.
+pytest.importorskip("mlflow")
+_spec = importlib.util.spec_from_file_location("model_deployment", os.path.join(ROOT, "scripts", "05_model_deployment.py"))
+deployment = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(deployment)
+
+
+@pytest.fixture(scope="module")
+def housing_rows():
+    rng = np.random.default_rng(0)
+    train = pd.DataFrame({
+        "median_income": rng.uniform(0.5, 15, 300),
+        "housing_median_age": rng.integers(1, 52, 300).astype(float),
+        "ocean_proximity": rng.choice(["INLAND", "NEAR BAY", "<1H OCEAN"], 300),
+    })
+    target = 40_000 * train["median_income"] + 30_000 * (train["ocean_proximity"] == "NEAR BAY") + rng.normal(0, 5_000, 300)
+    test = train.sample(40, random_state=0).reset_index(drop=True)
+    # A category the encoder never saw; handle_unknown='ignore' encodes it as all zeros.
+    test.loc[:9, "ocean_proximity"] = "ISLAND"
+    return train, target, test
+
+
+@pytest.mark.parametrize("max_depth", [None, 6])
+def test_compiled_model_matches_pipeline(tmp_path, housing_rows, max_depth):
+    train, target, test = housing_rows
+    # Same layout as the training step's pipeline.
+    pipeline = Pipeline(steps=[
+        ("preprocessor", ColumnTransformer(transformers=[
+            ("num", StandardScaler(), ["median_income", "housing_median_age"]),
+            ("cat", OneHotEncoder(handle_unknown="ignore"), ["ocean_proximity"]),
+        ], remainder="passthrough")),
+        ("regressor", RandomForestRegressor(n_estimators=8, max_depth=max_depth, random_state=0)),
+    ])
+    pipeline.fit(train, target)
+    path = tmp_path / "model_compiled.bin"
+    deployment.export_compiled_model(pipeline, str(path))
+    model = CompiledModel.load(str(path))
+
+    expected = pipeline.predict(test)
+    np.testing.assert_allclose(model.predict(test), expected)
+    np.testing.assert_allclose(model.predict(test.to_dict("records")), expected)
@@ -0,0 +1,113 @@
+import logging
+import math
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "pq")
+# Types that store lossy codes instead of the float vectors; their distances are approximate.
+QUANTIZED_TYPES = ("sq8", "pq", "ivf_pq")
+# faiss warns below ~39 training points per IVF list; PQ codebooks need 2**nbits points.
+MIN_POINTS_PER_LIST = 39
+
+
+def _auto_nlist(n):
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_LIST))
+
+
+def build_index(vectors, index_type="flat", nlist=None, pq_m=48, pq_nbits=8, hnsw_m=32,
+                ef_construction=80, train_sample_size=100_000, seed=0):
+    """
+    Builds a faiss index of `index_type` over `vectors` (L2 distance, row i gets id i).
+
+    - flat: exact search, cost linear in the corpus.
+    - ivf_flat: vectors bucketed into `nlist` k-means cells; a query scans `nprobe` cells.
+    - ivf_pq: as ivf_flat, but vectors are stored as `pq_m` x `pq_nbits`-bit product-quantizer codes.
+    - hnsw: navigable small-world graph with `hnsw_m` links per node; no training needed.
+    - sq8: exhaustive search over vectors stored as one int8 code per dimension (4x smaller).
+    - pq: exhaustive search over `pq_m` x `pq_nbits`-bit product-quantizer codes.
+
+    IVF quantizers and codebooks are trained on a random sample of at most
+    `train_sample_size` rows. Corpora too small to train on fall back to a flat index.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Use one of {INDEX_TYPES}.")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+
+    if index_type in ("ivf_pq", "pq") and d % pq_m:
+        raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {d}.")
+    min_points = 2 ** pq_nbits if index_type in ("ivf_pq", "pq") else 1
+    if index_type.startswith("ivf"):
+        nlist = nlist or _auto_nlist(n)
+        min_points = max(nlist * MIN_POINTS_PER_LIST, min_points)
+    if index_type not in ("flat", "hnsw") and n < min_points:
+        logger.warning(f"{n} vectors are too few to train a {index_type} index (need {min_points}); using a flat index.")
+        index_type = "flat"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(d)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        if index_type == "sq8":
+            index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit)
+        elif index_type == "pq":
+            index = faiss.IndexPQ(d, pq_m, pq_nbits)
+        elif index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(d), d, nlist)
+        else:
+            index = faiss.IndexIVFPQ(faiss.IndexFlatL2(d), d, nlist, pq_m, pq_nbits)
+        rng = np.random.default_rng(seed)
+        sample = vectors if n <= train_sample_size else vectors[rng.choice(n, train_sample_size, replace=False)]
+        index.train(sample)
+
+    if n:
+        index.add(vectors)
+    return index
+
+
+def index_type_of(index):
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivf_pq" if isinstance(faiss.try_extract_index_ivf(index), faiss.IndexIVFPQ) else "ivf_flat"
+    if hasattr(index, "hnsw"):
+        return "hnsw"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    return "flat"
+
+
+def exact_rerank(vectors, query, candidates, k):
+    """
+    Re-orders approximate `candidates` (index positions, -1 for none) by exact
+    squared L2 distance to `query`, using the float rows of `vectors` (which may
+    be a memmap: only the candidate rows are read). Returns (distances, positions) of the best k.
+    """
+    candidates = candidates[candidates >= 0]
+    distances = ((np.asarray(vectors[candidates], dtype=np.float32) - query) ** 2).sum(axis=1)
+    order = np.argsort(distances)[:k]
+    return distances[order], candidates[order]
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Applies query-time knobs: IVF cells scanned per query, HNSW candidate list size."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    if hasattr(index, "hnsw") and ef_search:
+        index.hnsw.efSearch = ef_search
+
+
+def search_params(index) -> dict:
+    ivf = faiss.try_extract_index_ivf(index)
+    params = {"index_type": index_type_of(index), "ntotal": index.ntotal}
+    if ivf is not None:
+        params.update(nlist=ivf.nlist, nprobe=ivf.nprobe)
+    if hasattr(index, "hnsw"):
+        params.update(ef_search=index.hnsw.efSearch)
+    return params
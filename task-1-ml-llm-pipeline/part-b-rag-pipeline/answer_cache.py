@@ -0,0 +1,116 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    return re.sub(r"\s+", " ", text.strip().lower()).rstrip("?!. ")
+
+
+class SemanticAnswerCache:
+    """
+    LRU/TTL cache of query answers with two lookup tiers.
+
+    1. Exact: the normalized query text.
+    2. Semantic: cosine similarity between the query embedding and the
+       embeddings of cached queries, accepted at or above `similarity_threshold`.
+
+    Entries are keyed on the index version they were answered from, so answers
+    from a previous corpus are never returned after a reindex.
+    """
+
+    def __init__(self, max_size: int, ttl_s: float, similarity_threshold: float):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # (index_version, normalized query) -> (value, unit embedding or None, expires_at)
+        self._lock = threading.Lock()
+        # Stacked embeddings for the semantic tier, rebuilt lazily after the entries change.
+        self._matrix = None
+        self._matrix_keys = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expire(self, now):
+        expired = [key for key, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _semantic_match(self, index_version, embedding):
+        if self._matrix is None:
+            self._matrix_keys = [key for key, (_, vector, _) in self._entries.items() if vector is not None]
+            self._matrix = np.stack([self._entries[key][1] for key in self._matrix_keys]) if self._matrix_keys else np.empty((0, len(embedding)))
+        if not self._matrix_keys:
+            return None
+        scores = self._matrix @ embedding
+        for i in np.argsort(-scores):
+            if scores[i] < self.similarity_threshold:
+                return None
+            if self._matrix_keys[i][0] == index_version:
+                return self._matrix_keys[i]
+        return None
+
+    def lookup(self, index_version, query: str, embed_fn):
+        """
+        Returns (value, embedding). `embed_fn(query)` is only called on an exact
+        miss; its result is returned as is, so the caller can reuse it for the
+        vector search and `put` it.
+        """
+        key = (index_version, normalize_query(query))
+        with self._lock:
+            self._expire(time.monotonic())
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return self._entries[key][0], None
+
+        embedding = embed_fn(query)
+        unit = self._unit(embedding)
+        with self._lock:
+            match = self._semantic_match(index_version, unit)
+            if match is not None and match in self._entries:
+                self._entries.move_to_end(match)
+                self.semantic_hits += 1
+                return self._entries[match][0], embedding
+            self.misses += 1
+        return None, embedding
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def put(self, index_version, query: str, embedding, value):
+        key = (index_version, normalize_query(query))
+        unit = self._unit(embedding) if embedding is not None else None
+        with self._lock:
+            self._entries[key] = (value, unit, time.monotonic() + self.ttl_s)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,144 @@
+"""
+Recall-vs-latency benchmark of the approximate index types against exact search.
+
+Vectors come from the service's embedding cache (real chunk embeddings) or are
+generated synthetically to simulate a larger corpus. A held-out sample of the
+vectors serves as queries; ground truth is the exact (flat) top-k. For every
+index type and query-time setting (IVF nprobe, HNSW efSearch) it reports
+recall@k, single-query latency percentiles, build time and index size.
+Quantized types are also measured with exact re-ranking of `k * rerank_factor`
+candidates, as the service does.
+
+    pip install faiss-cpu numpy
+    python benchmark_retrieval.py --synthetic 200000 --index-types flat,ivf_flat,ivf_pq,hnsw,sq8,pq --output retrieval.json
+"""
+import argparse
+import json
+import os
+import platform
+import time
+
+import faiss
+import numpy as np
+
+from ann_index import QUANTIZED_TYPES, build_index, exact_rerank, set_search_params
+
+def load_cached_vectors(cache_dir: str) -> np.ndarray:
+    with open(os.path.join(cache_dir, "meta.json")) as f:
+        dim = json.load(f)["dim"]
+    n_rows = os.path.getsize(os.path.join(cache_dir, "vectors.f32")) // (4 * dim)
+    return np.array(np.memmap(os.path.join(cache_dir, "vectors.f32"), dtype=np.float32, mode="r", shape=(n_rows, dim)))
+
+def synthetic_vectors(n: int, dim: int, seed: int) -> np.ndarray:
+    # Clustered unit vectors: closer to real embeddings than uniform noise, where every ANN index looks bad.
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(n // 100, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def measure(index, queries, truth, k, base=None, rerank_factor=0) -> dict:
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        if rerank_factor:
+            _, candidates = index.search(query[None, :], k * rerank_factor)
+            _, found = exact_rerank(base, query, candidates[0], k)
+            found = found[None, :]
+        else:
+            _, found = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[0]) & set(expected))
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "latency_ms": {
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+            "mean": float(latencies_ms.mean()),
+        },
+        "qps": len(queries) / float(np.sum(latencies)),
+    }
+
+def run(args) -> list:
+    vectors = synthetic_vectors(args.synthetic, args.dim, args.seed) if args.synthetic else load_cached_vectors(args.cache_dir)
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(vectors))
+    queries, base = vectors[order[:args.queries]], vectors[order[args.queries:]]
+    print(f"{len(base)} base vectors, {len(queries)} queries, dim {vectors.shape[1]}, k={args.k}")
+
+    exact = build_index(base, "flat")
+    _, truth = exact.search(queries, args.k)
+
+    build_params = {"nlist": args.nlist, "pq_m": args.pq_m, "hnsw_m": args.hnsw_m}
+    results = []
+    for index_type in args.index_types:
+        start = time.perf_counter()
+        index = build_index(base, index_type, **build_params)
+        build_s = time.perf_counter() - start
+        size_bytes = int(faiss.serialize_index(index).nbytes)
+        if index_type.startswith("ivf"):
+            settings = [{"nprobe": n} for n in args.nprobe]
+        elif index_type == "hnsw":
+            settings = [{"ef_search": ef} for ef in args.ef_search]
+        else:
+            settings = [{}]
+        rerank_factors = [0, args.rerank_factor] if index_type in QUANTIZED_TYPES and args.rerank_factor else [0]
+        for setting in settings:
+            set_search_params(index, **setting)
+            for rerank_factor in rerank_factors:
+                params = {**setting, "rerank": rerank_factor} if rerank_factor else setting
+                results.append({"index_type": index_type, "search_params": params, "build_s": build_s, "index_bytes": size_bytes,
+                                **measure(index, queries, truth, args.k, base, rerank_factor)})
+    return results
+
+def print_report(results):
+    print(f"{'index':<9} {'params':<24} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'qps':>9} {'build s':>8} {'size MB':>8}")
+    for r in results:
+        params = ",".join(f"{k}={v}" for k, v in r["search_params"].items()) or "-"
+        lat = r["latency_ms"]
+        print(f"{r['index_type']:<9} {params:<24} {r['recall_at_k']:>9.3f} {lat['p50']:>8.3f} {lat['p95']:>8.3f} "
+              f"{r['qps']:>9.0f} {r['build_s']:>8.2f} {r['index_bytes'] / 1e6:>8.1f}")
+
+def _ints(value):
+    return [int(v) for v in value.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache-dir", default="vectorstore/embedding_cache", help="Embedding cache to read chunk vectors from.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Benchmark this many synthetic vectors instead of the cache.")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of synthetic vectors (MiniLM: 384).")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-types", default="flat,ivf_flat,ivf_pq,hnsw,sq8,pq")
+    parser.add_argument("--nprobe", default="1,4,16,64", help="IVF cells probed per query.")
+    parser.add_argument("--ef-search", default="16,32,64,128", help="HNSW candidate list sizes.")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF cells; default ~4*sqrt(n).")
+    parser.add_argument("--pq-m", type=int, default=48)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--rerank-factor", type=int, default=4, help="Candidates per result re-ranked exactly for quantized types; 0 skips.")
+    parser.add_argument("--threads", type=int, default=1, help="faiss OpenMP threads; 1 matches one query per request.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+    args.index_types = args.index_types.split(",")
+    args.nprobe = _ints(args.nprobe)
+    args.ef_search = _ints(args.ef_search)
+
+    faiss.omp_set_num_threads(args.threads)
+    results = run(args)
+    print_report(results)
+
+    if args.output:
+        report = {
+            "timestamp": time.time(),
+            "host": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
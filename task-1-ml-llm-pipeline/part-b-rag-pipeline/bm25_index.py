@@ -0,0 +1,176 @@
+import json
+import os
+import re
+import shutil
+import uuid
+from collections import Counter
+
+import numpy as np
+
+BM25_FILENAME = "bm25.json"
+BM25_FORMAT_VERSION = 2
+# Longer "words" are almost always extraction noise, and would widen every entry of the term array.
+MAX_TERM_LENGTH = 64
+# Index arrays, one .npy file each. Posting lists are CSR rows: the entries of term i are
+# positions/frequencies[indptr[i]:indptr[i + 1]], with terms sorted so they can be binary searched.
+ARRAY_NAMES = ("ids", "terms", "indptr", "positions", "frequencies", "lengths", "idf", "norms")
+
+
+def tokenize(text: str):
+    """Lowercased word tokens; codes such as "X13" or "ISO-9001" keep their letter and digit parts."""
+    return [token for token in re.findall(r"\w+", text.lower()) if len(token) <= MAX_TERM_LENGTH]
+
+
+def _empty_arrays():
+    return {
+        "ids": np.array([], dtype=str),
+        "terms": np.array([], dtype=str),
+        "indptr": np.zeros(1, dtype=np.int64),
+        "positions": np.array([], dtype=np.int32),
+        "frequencies": np.array([], dtype=np.float32),
+        "lengths": np.array([], dtype=np.float32),
+        "idf": np.array([], dtype=np.float32),
+        "norms": np.array([], dtype=np.float32),
+    }
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over chunk texts, keyed by docstore id.
+
+    The posting lists are built at index time and saved as flat arrays that
+    are memory-mapped on load, so a loaded index costs no parsing and only
+    the pages a query touches are read. Chunks added or removed as documents
+    change are staged and merged into the arrays by `build`, which `save`
+    calls; searches see the last built state.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._arrays = _empty_arrays()
+        self._added = {}  # docstore id -> {term: frequency}, until the next build
+        self._removed = set()
+
+    def add(self, ids, texts):
+        for doc_id, text in zip(ids, texts):
+            self._added[doc_id] = Counter(tokenize(text))
+            self._removed.discard(doc_id)
+
+    def remove(self, ids):
+        for doc_id in ids:
+            self._added.pop(doc_id, None)
+            self._removed.add(doc_id)
+
+    def ids(self) -> set:
+        return (set(map(str, self._arrays["ids"])) - self._removed) | set(self._added)
+
+    def build(self):
+        """Merges the staged additions and removals into the posting arrays."""
+        if not self._added and not self._removed:
+            return
+        old = self._arrays
+        # Re-added ids replace their old entries.
+        keep = ~np.isin(old["ids"], list(self._removed | set(self._added)))
+        new_positions = np.cumsum(keep) - 1
+        old_entries = np.repeat(np.arange(len(old["terms"])), np.diff(old["indptr"]))
+        kept_entries = keep[old["positions"]]
+
+        kept_docs = int(keep.sum())
+        added_terms, added_positions, added_frequencies = [], [], []
+        for offset, counts in enumerate(self._added.values()):
+            added_terms.extend(counts)
+            added_positions.extend([kept_docs + offset] * len(counts))
+            added_frequencies.extend(counts.values())
+        added_terms = np.array(added_terms, dtype=str)
+
+        vocabulary = np.union1d(old["terms"], added_terms)
+        term_ids = np.concatenate([np.searchsorted(vocabulary, old["terms"])[old_entries[kept_entries]],
+                                   np.searchsorted(vocabulary, added_terms)])
+        positions = np.concatenate([new_positions[old["positions"][kept_entries]],
+                                    np.array(added_positions, dtype=np.int64)]).astype(np.int32)
+        frequencies = np.concatenate([old["frequencies"][kept_entries], np.array(added_frequencies, dtype=np.float32)])
+        order = np.lexsort((positions, term_ids))
+        # Terms left with no chunk drop out of the vocabulary.
+        used, term_ids = np.unique(term_ids[order], return_inverse=True)
+
+        ids = np.concatenate([old["ids"][keep], np.array(list(self._added), dtype=str)])
+        lengths = np.concatenate([old["lengths"][keep],
+                                  np.array([sum(counts.values()) for counts in self._added.values()], dtype=np.float32)])
+        document_frequencies = np.bincount(term_ids, minlength=len(used))
+        avg_length = max(float(lengths.mean()), 1.0) if len(lengths) else 1.0
+        self._arrays = {
+            "ids": ids,
+            "terms": vocabulary[used],
+            "indptr": np.concatenate([[0], np.cumsum(document_frequencies)]).astype(np.int64),
+            "positions": positions[order],
+            "frequencies": frequencies[order],
+            "lengths": lengths,
+            "idf": np.log(1 + (len(ids) - document_frequencies + 0.5) / (document_frequencies + 0.5)).astype(np.float32),
+            # Length normalization from the BM25 denominator: k1 * (1 - b + b * len / avg_len).
+            "norms": (self.k1 * (1 - self.b + self.b * lengths / avg_length)).astype(np.float32),
+        }
+        self._added, self._removed = {}, set()
+
+    def search(self, query: str, k: int):
+        """Returns up to k (docstore id, score) pairs, best first; chunks sharing no term with the query are left out."""
+        arrays = self._arrays
+        terms, indptr = arrays["terms"], arrays["indptr"]
+        query_terms = np.array(sorted(set(tokenize(query))), dtype=str)
+        rows = np.searchsorted(terms, query_terms)
+        rows = [int(row) for row, term in zip(rows, query_terms) if row < len(terms) and terms[row] == term]
+        if not rows:
+            return []
+        norms = arrays["norms"]
+        scores = np.zeros(len(norms), dtype=np.float32)
+        for row in rows:
+            start, end = indptr[row], indptr[row + 1]
+            positions, frequencies = arrays["positions"][start:end], arrays["frequencies"][start:end]
+            scores[positions] += arrays["idf"][row] * frequencies * (self.k1 + 1) / (frequencies + norms[positions])
+        matched = np.flatnonzero(scores)
+        top = matched[np.argsort(-scores[matched])[:k]]
+        return [(str(arrays["ids"][i]), float(scores[i])) for i in top]
+
+    def save(self, folder_path: str):
+        """
+        Builds, writes the arrays to a new `bm25-*` directory and points
+        `bm25.json` at it, then maps them back in place of the in-memory copy.
+        Older directories are removed; indexes already mapped from them stay
+        readable until they are dropped.
+        """
+        self.build()
+        directory = f"bm25-{uuid.uuid4().hex}"
+        os.makedirs(os.path.join(folder_path, directory))
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(folder_path, directory, f"{name}.npy"), self._arrays[name])
+        path = os.path.join(folder_path, BM25_FILENAME)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"format_version": BM25_FORMAT_VERSION, "k1": self.k1, "b": self.b, "directory": directory}, f)
+        os.replace(tmp_path, path)
+        for name in os.listdir(folder_path):
+            if name.startswith("bm25-") and name != directory:
+                shutil.rmtree(os.path.join(folder_path, name), ignore_errors=True)
+        self._arrays = self._map_arrays(os.path.join(folder_path, directory))
+
+    @staticmethod
+    def _map_arrays(directory: str):
+        return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ARRAY_NAMES}
+
+    @classmethod
+    def load(cls, folder_path: str):
+        """Returns the saved index, memory-mapped, or None if there is none in a readable format."""
+        try:
+            with open(os.path.join(folder_path, BM25_FILENAME)) as f:
+                data = json.load(f)
+            if data.get("format_version") != BM25_FORMAT_VERSION:
+                return None
+            index = cls(data["k1"], data["b"])
+            index._arrays = cls._map_arrays(os.path.join(folder_path, data["directory"]))
+        except (OSError, ValueError, KeyError):
+            return None
+        return index
+
+    def stats(self) -> dict:
+        return {"chunks": len(self._arrays["ids"]), "terms": len(self._arrays["terms"]),
+                "postings": len(self._arrays["positions"])}
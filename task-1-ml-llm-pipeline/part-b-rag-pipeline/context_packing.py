@@ -0,0 +1,111 @@
+from typing import Callable, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Chunks of a page this many characters apart (the line break the splitter dropped) count as adjacent.
+MAX_ADJACENT_GAP = 2
+# A passage that does not fit is cut to the remaining budget, unless fewer tokens than this are left
+# and another passage is already packed.
+MIN_PASSAGE_TOKENS = 32
+
+
+def _normalized(text):
+    return " ".join(text.split())
+
+
+def merge_chunks(docs, max_gap: int = MAX_ADJACENT_GAP):
+    """
+    Turns ranked chunks into ranked passages.
+
+    Chunks of the same source page whose character spans (from the splitter's
+    `start_index`) overlap or are adjacent become one passage, with the
+    overlapping text written once. A passage whose text is already contained in
+    a better-ranked one, e.g. from a duplicate PDF, is dropped. Passages are
+    ordered by their best chunk and keep that chunk's metadata.
+    """
+    # [best rank, start, end, text, metadata] per passage; spans are None for chunks without offsets.
+    passages = []
+    by_page = {}
+    for rank, doc in enumerate(docs):
+        start = doc.metadata.get("start_index")
+        if start is None:
+            passages.append([rank, None, None, doc.page_content, doc.metadata])
+            continue
+        by_page.setdefault((doc.metadata.get("source"), doc.metadata.get("page")), []).append((start, rank, doc))
+    for chunks in by_page.values():
+        chunks.sort(key=lambda chunk: chunk[0])
+        current = None
+        for start, rank, doc in chunks:
+            end = start + len(doc.page_content)
+            if current is not None and start <= current[2] + max_gap:
+                if end > current[2]:
+                    overlap = current[2] - start
+                    current[3] += doc.page_content[overlap:] if overlap >= 0 else "\n" + doc.page_content
+                    current[2] = end
+                if rank < current[0]:
+                    current[0], current[4] = rank, doc.metadata
+                continue
+            current = [rank, start, end, doc.page_content, doc.metadata]
+            passages.append(current)
+    passages.sort(key=lambda passage: passage[0])
+
+    kept, kept_texts = [], []
+    for _, start, _, text, metadata in passages:
+        normalized = _normalized(text)
+        if any(normalized in other for other in kept_texts):
+            continue
+        kept_texts.append(normalized)
+        kept.append(Document(page_content=text, metadata={**metadata, "start_index": start} if start is not None else metadata))
+    return kept
+
+
+def _truncate(text, max_tokens, count_tokens):
+    # Cut proportionally, then back to a word boundary, until it fits.
+    tokens = count_tokens(text)
+    while text and tokens > max_tokens:
+        cut = int(len(text) * max_tokens / tokens * 0.95)
+        text = text[:cut].rsplit(" ", 1)[0] if " " in text[:cut] else text[:cut]
+        tokens = count_tokens(text)
+    return text
+
+
+def pack_documents(docs, token_budget: int, count_tokens: Callable[[str], int], separator: str = "\n\n"):
+    """
+    Merges ranked chunks into passages (see `merge_chunks`) and keeps the best
+    ones whose text, joined by `separator`, fits in `token_budget` tokens. The
+    first passage that does not fit is cut to the remaining budget, so the best
+    passage is always included.
+    """
+    packed, remaining = [], token_budget
+    separator_tokens = count_tokens(separator)
+    for passage in merge_chunks(docs):
+        cost = count_tokens(passage.page_content) + (separator_tokens if packed else 0)
+        if cost <= remaining:
+            packed.append(passage)
+            remaining -= cost
+            continue
+        available = remaining - (separator_tokens if packed else 0)
+        if available >= MIN_PASSAGE_TOKENS or not packed:
+            text = _truncate(passage.page_content, available, count_tokens)
+            packed.append(Document(page_content=text, metadata=passage.metadata))
+        break
+    return packed
+
+
+class ContextPackingRetriever(BaseRetriever):
+    """
+    Wraps a retriever so the "stuff" chain receives packed passages instead of
+    raw chunks: overlapping and adjacent chunks merged, repeats dropped, and
+    the total held to `token_budget` prompt tokens.
+    """
+
+    base_retriever: BaseRetriever
+    token_budget: int
+    count_tokens: Callable[[str], int]
+    separator: str = "\n\n"
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs) -> List[Document]:
+        docs = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()}, **kwargs)
+        return pack_documents(docs, self.token_budget, self.count_tokens, self.separator)
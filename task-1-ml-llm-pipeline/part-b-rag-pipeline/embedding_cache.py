@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+VECTORS_FILENAME = "vectors.f32"
+KEYS_FILENAME = "keys.bin"
+META_FILENAME = "meta.json"
+DIGEST_SIZE = 32
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with a persistent cache of document embeddings.
+
+    Vectors are keyed on sha256(model name, chunk text), so identical chunks
+    (across rebuilds, re-chunking runs or duplicated PDFs) are embedded once.
+    The cache is two append-only files: `vectors.f32`, raw float32 rows read
+    through a memory map, and `keys.bin`, the 32-byte digest of each row in
+    the same order. Rows are appended before their keys, so a torn write only
+    ever leaves an unreferenced row behind. Queries are passed straight through.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, cache_dir: str):
+        self.base = base
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._dim = None
+        self._vectors = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._open()
+
+    def _path(self, filename):
+        return os.path.join(self.cache_dir, filename)
+
+    def _open(self):
+        try:
+            with open(self._path(META_FILENAME)) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            meta = None
+        if meta is None or meta.get("model_name") != self.model_name:
+            # Different model (or no cache yet): start over rather than mix vector spaces.
+            for filename in (VECTORS_FILENAME, KEYS_FILENAME, META_FILENAME):
+                if os.path.exists(self._path(filename)):
+                    os.remove(self._path(filename))
+            return
+        self._dim = meta["dim"]
+        # A missing keys or vectors file (e.g. removed by hand) just means no usable rows.
+        try:
+            with open(self._path(KEYS_FILENAME), "rb") as f:
+                keys = f.read()
+            vectors_size = os.path.getsize(self._path(VECTORS_FILENAME))
+        except FileNotFoundError:
+            keys, vectors_size = b"", 0
+        n_rows = min(len(keys) // DIGEST_SIZE, vectors_size // (4 * self._dim))
+        self._rows = {keys[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]: i for i in range(n_rows)}
+        self._map(n_rows)
+
+    def _map(self, n_rows):
+        self._vectors = np.memmap(self._path(VECTORS_FILENAME), dtype=np.float32, mode="r", shape=(n_rows, self._dim)) if n_rows else None
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def _append(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        new_cache = self._dim is None
+        if new_cache:
+            self._dim = vectors.shape[1]
+        start = len(self._rows)
+        # Truncate any orphaned rows from an interrupted append so row numbers stay aligned with keys.
+        with open(self._path(VECTORS_FILENAME), "ab") as f:
+            f.truncate(start * 4 * self._dim)
+            f.write(vectors.tobytes())
+        with open(self._path(KEYS_FILENAME), "ab") as f:
+            f.truncate(start * DIGEST_SIZE)
+            f.write(b"".join(keys))
+        if new_cache:
+            # Written only once the first rows are on disk, so a cache with a meta file always has both data files.
+            with open(self._path(META_FILENAME), "w") as f:
+                json.dump({"model_name": self.model_name, "dim": self._dim}, f)
+        for i, key in enumerate(keys):
+            self._rows[key] = start + i
+        self._map(len(self._rows))
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in self._rows and key not in missing:
+                    missing[key] = text
+            if missing:
+                self._append(list(missing), self.base.embed_documents(list(missing.values())))
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            if not texts:
+                return []
+            return self._vectors[[self._rows[key] for key in keys]].tolist()
+
+    def embed_query(self, text):
+        return self.base.embed_query(text)
+
+    def stats(self):
+        return {"entries": len(self._rows), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,109 @@
+import asyncio
+
+from inference import QueueFullError
+
+
+class GenerationBatcher:
+    """
+    Coalesces prompts from concurrent requests into padded batches for one LLM call.
+
+    A batch is only formed once an inference worker is free: the first waiting
+    prompt opens it, and it is sent when `max_batch_size` prompts are collected
+    or `max_wait_ms` has passed. Prompts that arrive while a batch is
+    generating queue up and go out together in the next one, so the batch size
+    grows with load instead of waiting out a fixed window. At most
+    `max_pending` prompts may wait; beyond that `submit` raises QueueFullError.
+    """
+
+    def __init__(self, generate_fn, executor, max_batch_size: int, max_wait_ms: float, max_pending: int):
+        # generate_fn(prompts) -> list of completions, run on the inference executor.
+        self._generate_fn = generate_fn
+        self._executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.max_pending = max_pending
+        self._queue = None
+        self._slots = None
+        self._task = None
+        self.batches = 0
+        self.prompts = 0
+        self.rejected = 0
+        self.largest_batch = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self._executor.max_workers)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, prompt: str) -> str:
+        if self._queue.qsize() >= self.max_pending:
+            self.rejected += 1
+            raise QueueFullError(f"{self._queue.qsize()} prompts are already waiting for generation.")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((prompt, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        items = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_s
+        while len(items) < self.max_batch_size:
+            try:
+                items.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Callers that timed out or disconnected while waiting are not generated for.
+        return [(prompt, future) for prompt, future in items if not future.done()]
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            items = await self._collect()
+            if not items:
+                self._slots.release()
+                continue
+            asyncio.create_task(self._generate(items))
+
+    async def _generate(self, items):
+        try:
+            self.batches += 1
+            self.prompts += len(items)
+            self.largest_batch = max(self.largest_batch, len(items))
+            outputs = await self._executor.submit(self._generate_fn, [prompt for prompt, _ in items])
+            for (_, future), output in zip(items, outputs):
+                if not future.done():
+                    future.set_result(output)
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000,
+            "waiting": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "mean_batch_size": self.prompts / self.batches if self.batches else None,
+            "largest_batch": self.largest_batch,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,47 @@
+from concurrent.futures import Executor
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+def reciprocal_rank_fusion(rankings, rrf_k: int = 60):
+    """Fuses ranked id lists: an id scores sum(1 / (rrf_k + rank)) over the lists it appears in. Returns ids, best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves `fetch_k` chunks each from the vector store and the BM25 keyword
+    index, and returns the `k` best by reciprocal-rank fusion.
+
+    The vector lookup (query embedding and index search) runs on `executor`
+    while the keyword lookup runs on the calling thread, so a query costs
+    about as long as the slower of the two.
+    """
+
+    vector_store: Any
+    keyword_index: Any
+    executor: Executor
+    k: int = 2
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                query_embedding: Optional[List[float]] = None) -> List[Document]:
+        vector_future = self.executor.submit(self.vector_store.similarity_search, query, self.fetch_k,
+                                             query_embedding=query_embedding)
+        keyword_hits = self.keyword_index.search(query, self.fetch_k)
+        vector_docs = {doc.id: doc for doc in vector_future.result()}
+        fused = reciprocal_rank_fusion([list(vector_docs), [doc_id for doc_id, _ in keyword_hits]], self.rrf_k)
+        docs = []
+        for doc_id in fused[:self.k]:
+            doc = vector_docs.get(doc_id) or self.vector_store.docstore.search(doc_id)
+            if isinstance(doc, Document):
+                docs.append(doc)
+        return docs
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+
+# Stored next to the FAISS files; describes the corpus and settings the index was built from,
+# including the docstore ids of every file's chunks so they can be removed later.
+MANIFEST_FILENAME = "manifest.json"
+# Bump when the index layout changes so older indexes are rebuilt instead of loaded.
+MANIFEST_FORMAT_VERSION = 2
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_documents(docs_path, previous_files=None):
+    """
+    Returns {filename: {"size", "mtime_ns", "sha256"}} for every PDF in `docs_path`.
+
+    Files whose size and modification time match `previous_files` reuse the
+    recorded hash, so an unchanged corpus costs one stat per file rather than
+    a full read.
+    """
+    previous_files = previous_files or {}
+    files = {}
+    for filename in sorted(os.listdir(docs_path)):
+        if not filename.endswith(".pdf"):
+            continue
+        stat = os.stat(os.path.join(docs_path, filename))
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        known = previous_files.get(filename)
+        if known and known["size"] == entry["size"] and known["mtime_ns"] == entry["mtime_ns"]:
+            entry["sha256"] = known["sha256"]
+        else:
+            entry["sha256"] = _file_digest(os.path.join(docs_path, filename))
+        files[filename] = entry
+    return files
+
+
+def load_manifest(index_path):
+    try:
+        with open(os.path.join(index_path, MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get("format_version") != MANIFEST_FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def remove_manifest(index_path):
+    """Called before an index is rewritten, so a crash mid-write never leaves a matching manifest behind."""
+    try:
+        os.remove(os.path.join(index_path, MANIFEST_FILENAME))
+    except FileNotFoundError:
+        pass
+
+
+def save_manifest(index_path, files, settings):
+    """Written after the index itself, so a manifest on disk always describes a complete index."""
+    manifest = {"format_version": MANIFEST_FORMAT_VERSION, "settings": settings, "files": files}
+    path = os.path.join(index_path, MANIFEST_FILENAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def index_version(manifest):
+    """Short digest of the indexed file contents and settings; changes whenever the index does."""
+    if manifest is None:
+        return None
+    fingerprint = {
+        "settings": manifest["settings"],
+        "files": {name: entry["sha256"] for name, entry in manifest["files"].items()},
+    }
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def plan_changes(indexed_files, files):
+    """
+    Compares the files recorded in the manifest with the current scan.
+    Returns (to_add, to_remove): new or modified files to embed, and indexed
+    files (deleted or modified) whose chunks must be removed.
+    """
+    to_add = [name for name, entry in files.items()
+              if name not in indexed_files or indexed_files[name]["sha256"] != entry["sha256"]]
+    to_remove = [name for name in indexed_files if name not in files or name in to_add]
+    return to_add, to_remove
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue is at capacity."""
+
+
+class InferenceExecutor:
+    """
+    Runs blocking retrieval + generation calls on a small, dedicated thread pool.
+
+    The event loop only awaits the result, so a long generation no longer
+    stalls other requests. Work is started in arrival (FIFO) order, at most
+    `max_workers` at a time; up to `max_queue` more calls may wait. Beyond
+    that, `run` raises QueueFullError immediately instead of letting latency
+    grow without bound. A caller that waits longer than `timeout_s` gets
+    asyncio.TimeoutError; if its call had not started yet it is dropped from
+    the queue, otherwise it finishes in the background and its slot is freed then.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, timeout_s: float, thread_name_prefix: str = "inference"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_queue_wait_s = 0.0
+
+    def _release(self, _future):
+        with self._lock:
+            self._outstanding -= 1
+
+    def _call(self, fn, args, enqueued_at):
+        with self._lock:
+            self._running += 1
+            self.total_queue_wait_s += time.perf_counter() - enqueued_at
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        """
+        Queues `fn(*args)` and returns an awaitable for its result without
+        applying the timeout. Raises QueueFullError right away when the queue is at capacity.
+        """
+        with self._lock:
+            if self._outstanding >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"{self._outstanding} inference calls are already running or queued.")
+            self._outstanding += 1
+        future = self._executor.submit(self._call, fn, args, time.perf_counter())
+        future.add_done_callback(self._release)
+        return asyncio.wrap_future(future)
+
+    async def run(self, fn, *args):
+        future = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(future, self.timeout_s)
+        except asyncio.TimeoutError:
+            self.record_timeout()
+            raise
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._outstanding - self._running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "mean_queue_wait_s": self.total_queue_wait_s / self.completed if self.completed else None,
+            }
@@ -0,0 +1,36 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+
+def load_and_split(path, chunk_size, chunk_overlap):
+    """
+    Loads one PDF and splits it into chunks that keep its `source`/`page`
+    metadata, plus the chunk's character offset in the page as `start_index`.
+    """
+    docs = PyPDFLoader(path).load()
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    return text_splitter.split_documents(docs)
+
+
+def iter_split_documents(paths, chunk_size, chunk_overlap, max_workers):
+    """
+    Yields (path, chunks) for every PDF as soon as it has been parsed, in
+    completion order, so the caller can embed finished files while the rest
+    are still being extracted.
+
+    Parsing runs in a pool of worker processes. They are spawned rather than
+    forked because the parent has already initialised torch (and possibly
+    CUDA), which is not fork-safe; the workers import only this module.
+    """
+    if max_workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield path, load_and_split(path, chunk_size, chunk_overlap)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(paths)), mp_context=get_context("spawn")) as pool:
+        futures = {pool.submit(load_and_split, path, chunk_size, chunk_overlap): path for path in paths}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
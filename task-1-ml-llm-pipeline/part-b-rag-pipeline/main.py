@@ -1,18 +1,38 @@
+import asyncio
+import json
 import os
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
+import numpy as np
 import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_huggingface import HuggingFacePipeline
 from langchain.chains import RetrievalQA
+from langchain_core.prompts import PromptTemplate
 
 import logging
 
+from ann_index import QUANTIZED_TYPES, build_index, index_type_of, search_params, set_search_params
+from answer_cache import SemanticAnswerCache
+from bm25_index import BM25Index
+from context_packing import ContextPackingRetriever
+from embedding_cache import CachedEmbeddings
+from generation_batcher import GenerationBatcher
+from hybrid_retriever import HybridRetriever
+from inference import InferenceExecutor, QueueFullError
+from ingestion import iter_split_documents
+from indexing import index_version as manifest_index_version, load_manifest, plan_changes, remove_manifest, save_manifest, scan_documents
+from sqlite_docstore import SQLiteDocstore
+from vector_store import RerankingFAISS
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,11 +42,95 @@ logger = logging.getLogger(__name__)
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 # Use a small, open-source LLM for generation
 LLM_MODEL_NAME = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+# Generation settings shared by every endpoint, batched, single or streamed.
+LLM_PIPELINE_KWARGS = {
+    "max_new_tokens": 256,
+    "top_p": 0.95,
+    "temperature": 0.1,
+    "repetition_penalty": 1.15
+}
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 logger.info(f"Using device: {DEVICE}")
 
 DOCS_PATH = "./docs"
 DB_FAISS_PATH = "vectorstore/db_faiss"
+# Chunk embeddings keyed by content hash, reused across rebuilds and duplicate chunks.
+EMBEDDING_CACHE_DIR = "vectorstore/embedding_cache"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+# Worker processes that extract and split PDFs in parallel during (re)indexing.
+INGEST_WORKERS = os.cpu_count() or 1
+# Chunks handed to the embedding model per call while parsing continues in the background.
+EMBED_BATCH_SIZE = 256
+# Concurrent chain invocations; on CPU one generation already uses every core.
+INFERENCE_WORKERS = 1
+# Queries allowed to wait for a worker; further queries get 429 until the queue drains.
+INFERENCE_QUEUE_SIZE = 8
+# Queries still waiting (or running) after this long get 503.
+INFERENCE_TIMEOUT_S = 120
+# Dynamic batching of /query-api generations: concurrent prompts share one padded forward pass.
+GENERATION_BATCHING_ENABLED = True
+GENERATION_MAX_BATCH_SIZE = 4
+# How long the first prompt of a batch waits for others to join.
+GENERATION_MAX_WAIT_MS = 50
+# Prompts allowed to wait for a batch; further queries get 429.
+GENERATION_MAX_PENDING = 16
+# Concurrent query preparations (answer cache lookup, then retrieval) while generation is batched.
+# Up to INFERENCE_QUEUE_SIZE more wait; beyond that, queries get 429 before they reach the batcher.
+QUERY_WORKERS = 2
+# Cache of answers by normalized query, then by query-embedding cosine similarity. 0 disables it.
+ANSWER_CACHE_SIZE = 1000
+ANSWER_CACHE_TTL_S = 3600
+ANSWER_CACHE_SIMILARITY = 0.95
+
+# Shared by the "stuff" QA chain and the streaming endpoint, so both send the LLM the same prompt.
+QA_PROMPT = PromptTemplate.from_template(
+    "Use the following pieces of context to answer the question at the end. "
+    "If you don't know the answer, just say that you don't know, don't try to make up an answer.\n\n"
+    "{context}\n\n"
+    "Question: {question}\n"
+    "Helpful Answer:"
+)
+# Search index: "flat" (exact) or, for large corpora, "ivf_flat", "ivf_pq" or "hnsw" (approximate).
+# "sq8" (int8 codes, 4x smaller) and "pq" (pq_m bytes per vector) keep exhaustive search but shrink the index.
+INDEX_TYPE = "flat"
+# Build parameters for approximate indexes (see ann_index.build_index); nlist=None picks ~4*sqrt(n).
+ANN_BUILD_PARAMS = {"nlist": None, "pq_m": 48, "pq_nbits": 8, "hnsw_m": 32, "ef_construction": 80, "train_sample_size": 100_000}
+# Query-time recall/latency trade-off for IVF (cells probed) and HNSW (candidate list size).
+# Adjustable at runtime with POST /search-params.
+SEARCH_NPROBE = 16
+HNSW_EF_SEARCH = 64
+# Quantized indexes ("sq8", "pq", "ivf_pq") fetch this many times k candidates and re-rank them by
+# exact distance, reading the float vectors from a memory-mapped file. 0 keeps the quantized ranking.
+RERANK_CANDIDATES_FACTOR = 4
+# Chunk text and metadata: "sqlite" reads chunks from disk by id, "memory" keeps every chunk in RAM.
+DOCSTORE_BACKEND = "sqlite"
+# Chunks retrieved per query; with context packing, as many as fit CONTEXT_TOKEN_BUDGET are used.
+RETRIEVAL_K = 6
+# Context assembly before the "stuff" prompt: retrieved chunks that overlap or sit next to each other
+# on a page are merged, repeated text is dropped, and the best-ranked passages are packed into at most
+# this many tokens, which bounds prompt prefill time. 0 passes the retrieved chunks through unchanged.
+CONTEXT_TOKEN_BUDGET = 384
+# Hybrid retrieval: a BM25 keyword index over the same chunks, saved next to the FAISS index, finds
+# exact terms (product codes, acronyms) that embeddings miss. Its ranking is fused with the vector one.
+HYBRID_SEARCH_ENABLED = True
+# Candidates taken from each ranking before fusion.
+HYBRID_FETCH_K = 20
+# Reciprocal-rank fusion constant: a chunk scores sum(1 / (RRF_K + rank)) over both rankings.
+RRF_K = 60
+# Threads running the vector side of hybrid lookups while the keyword side runs on the caller.
+RETRIEVAL_WORKERS = 4
+# Everything that changes the stored vectors; a saved index is only reused if these match.
+INDEX_SETTINGS = {
+    "embedding_model": EMBEDDING_MODEL_NAME,
+    "chunk_size": CHUNK_SIZE,
+    "chunk_overlap": CHUNK_OVERLAP,
+    "index_type": INDEX_TYPE,
+    "ann_build_params": ANN_BUILD_PARAMS if INDEX_TYPE != "flat" else None,
+    "docstore": DOCSTORE_BACKEND,
+    # Chunks carry their page offset (`start_index`), which context packing uses to merge them.
+    "chunk_offsets": True,
+}
 
 # --- FastAPI App Initialization ---
 app = FastAPI(title="RAG-style LLM Pipeline POC")
@@ -35,68 +139,277 @@ app = FastAPI(title="RAG-style LLM Pipeline POC")
 class Query(BaseModel):
     text: str
 
+class SearchParams(BaseModel):
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    rerank_factor: Optional[int] = None
+
 # --- RAG Pipeline Components (Global State) ---
 db = None
 qa_chain = None
+llm = None
+embeddings = None
+inference_executor = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, INFERENCE_TIMEOUT_S)
+# Bounded like the inference executor, but separate so retrieval can run while a batch generates.
+query_executor = InferenceExecutor(QUERY_WORKERS, INFERENCE_QUEUE_SIZE, INFERENCE_TIMEOUT_S, thread_name_prefix="query")
+generation_batcher = None
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+# Current query-time search knobs, applied to every index that is loaded or built.
+search_settings = {"nprobe": SEARCH_NPROBE, "ef_search": HNSW_EF_SEARCH, "rerank_factor": RERANK_CANDIDATES_FACTOR}
+# Identifies the corpus the current index was built from; answer cache entries are scoped to it.
+index_version = None
+answer_cache = SemanticAnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_S, ANSWER_CACHE_SIMILARITY) if ANSWER_CACHE_SIZE > 0 else None
+# Serializes index updates (startup and /reindex); queries never take it.
+index_lock = threading.Lock()
 
 # --- Application Logic ---
+def _new_docstore_path():
+    # Every index update writes a new file, so the served store never sees a half-applied update.
+    os.makedirs(DB_FAISS_PATH, exist_ok=True)
+    return os.path.join(DB_FAISS_PATH, f"docstore-{uuid.uuid4().hex}.sqlite")
+
+def _new_docstore():
+    return InMemoryDocstore() if DOCSTORE_BACKEND == "memory" else SQLiteDocstore(_new_docstore_path())
+
+def _detach_docstore(store):
+    """Moves a loaded store onto its own copy of the docstore file before it is modified."""
+    if isinstance(store.docstore, SQLiteDocstore):
+        loaded = store.docstore
+        store.docstore = loaded.copy_to(_new_docstore_path())
+        loaded.close()
+
+def _prune_docstores(store):
+    # Connections of the previously served store keep reading an unlinked file until it is dropped.
+    current = os.path.basename(store.docstore.path) if isinstance(store.docstore, SQLiteDocstore) else None
+    for name in os.listdir(DB_FAISS_PATH):
+        if name.startswith("docstore-") and name != current:
+            os.remove(os.path.join(DB_FAISS_PATH, name))
+
+def _apply_search_settings(store):
+    set_search_params(store.index, nprobe=search_settings["nprobe"], ef_search=search_settings["ef_search"])
+    store.rerank_factor = search_settings["rerank_factor"]
+
+def _load_keyword_index(store):
+    """
+    Loads the saved BM25 index, or rebuilds it from the docstore if it is
+    missing or does not cover exactly the chunks in the store.
+    """
+    if not HYBRID_SEARCH_ENABLED:
+        return None
+    keyword_index = BM25Index.load(DB_FAISS_PATH)
+    ids = list(store.index_to_docstore_id.values())
+    if keyword_index is None or keyword_index.ids() != set(ids):
+        logger.info(f"Building BM25 keyword index over {len(ids)} chunks...")
+        keyword_index = BM25Index()
+        keyword_index.add(ids, [store.docstore.search(doc_id).page_content for doc_id in ids])
+        keyword_index.save(DB_FAISS_PATH)
+    return keyword_index
+
+def _add_chunks(store, chunks, ids):
+    if store is None:
+        store = RerankingFAISS.from_documents(chunks, embeddings, ids=ids, docstore=_new_docstore())
+        store.keyword_index = BM25Index() if HYBRID_SEARCH_ENABLED else None
+    else:
+        store.add_documents(chunks, ids=ids)
+    if store.keyword_index is not None:
+        store.keyword_index.add(ids, [chunk.page_content for chunk in chunks])
+    return store
+
+def _use_flat_index(store):
+    """
+    Swaps an approximate index for an exact one before the store is modified:
+    IVF ids do not shift on removal the way the store's id map expects, and HNSW
+    cannot remove at all. Vectors come from the re-rank file or the embedding
+    cache, so no text is re-embedded.
+    """
+    if INDEX_TYPE == "flat":
+        return
+    if store.rerank_vectors is not None:
+        vectors = np.array(store.rerank_vectors)
+    else:
+        docs = [store.docstore.search(store.index_to_docstore_id[i]) for i in range(store.index.ntotal)]
+        vectors = embeddings.embed_documents([doc.page_content for doc in docs]) if docs else np.empty((0, store.index.d))
+    store.index = build_index(vectors, "flat")
+    # Positions shift as chunks are removed; the re-rank vectors are rebuilt with the index.
+    store.rerank_vectors = None
+
+def _build_search_index(store):
+    """Rebuilds the configured approximate index from the exact one, training on a sample."""
+    if INDEX_TYPE != "flat":
+        logger.info(f"Building {INDEX_TYPE} index over {store.index.ntotal} vectors...")
+        vectors = store.index.reconstruct_n(0, store.index.ntotal)
+        store.index = build_index(vectors, INDEX_TYPE, **ANN_BUILD_PARAMS)
+        if index_type_of(store.index) in QUANTIZED_TYPES:
+            # Written next to the index by save_local and memory-mapped from there.
+            store.rerank_vectors = vectors
+
+def sync_vector_store():
+    """
+    Brings the saved index in line with ./docs and returns it, or None if there is nothing to index.
+
+    The saved index is loaded from disk, so the store returned is a fresh copy
+    that the served one is not sharing. Only new or modified PDFs are parsed
+    and embedded; chunks of modified or deleted PDFs are removed by the ids
+    recorded in the manifest. The index is saved again only if something changed.
+    """
+    manifest = load_manifest(DB_FAISS_PATH)
+    # Incremental updates need an index built with the same embedding model and chunking.
+    if manifest is not None and (manifest["settings"] != INDEX_SETTINGS or not os.path.exists(os.path.join(DB_FAISS_PATH, "index.faiss"))):
+        logger.info("Index settings changed; rebuilding the FAISS vector store from scratch.")
+        manifest = None
+    indexed_files = manifest["files"] if manifest else {}
+    files = scan_documents(DOCS_PATH, indexed_files) if os.path.isdir(DOCS_PATH) else {}
+
+    store = None
+    if manifest is not None:
+        # The index was written by this service, so unpickling its docstore is safe.
+        store = RerankingFAISS.load_local(DB_FAISS_PATH, embeddings, allow_dangerous_deserialization=True)
+        store.keyword_index = _load_keyword_index(store)
+
+    to_add, to_remove = plan_changes(indexed_files, files)
+    if not to_add and not to_remove:
+        if store is not None:
+            logger.info(f"Documents unchanged; loaded FAISS vector store from {DB_FAISS_PATH}.")
+            _apply_search_settings(store)
+        return store if files else None
+
+    logger.info(f"Updating FAISS vector store: {len(to_add)} new or modified and {len(to_remove)} removed documents.")
+    if store is not None:
+        _detach_docstore(store)
+        _use_flat_index(store)
+    stale_ids = [doc_id for name in to_remove for doc_id in indexed_files[name]["ids"]]
+    if stale_ids:
+        store.delete(stale_ids)
+        if store.keyword_index is not None:
+            store.keyword_index.remove(stale_ids)
+
+    # PDFs are parsed in worker processes; finished chunks are embedded in batches as they arrive.
+    pending, pending_ids = [], []
+    paths = [os.path.join(DOCS_PATH, filename) for filename in to_add]
+    for path, chunks in iter_split_documents(paths, CHUNK_SIZE, CHUNK_OVERLAP, INGEST_WORKERS):
+        filename = os.path.basename(path)
+        ids = [str(uuid.uuid4()) for _ in chunks]
+        files[filename]["ids"] = ids
+        if not chunks:
+            logger.warning(f"No text extracted from {filename}.")
+        pending.extend(chunks)
+        pending_ids.extend(ids)
+        while len(pending) >= EMBED_BATCH_SIZE:
+            store = _add_chunks(store, pending[:EMBED_BATCH_SIZE], pending_ids[:EMBED_BATCH_SIZE])
+            del pending[:EMBED_BATCH_SIZE], pending_ids[:EMBED_BATCH_SIZE]
+    if pending:
+        store = _add_chunks(store, pending, pending_ids)
+    for filename, entry in files.items():
+        entry.setdefault("ids", indexed_files.get(filename, {}).get("ids", []))
+
+    if store is None:
+        return None
+    _build_search_index(store)
+    _apply_search_settings(store)
+    remove_manifest(DB_FAISS_PATH)
+    store.save_local(DB_FAISS_PATH)
+    if store.keyword_index is not None:
+        store.keyword_index.save(DB_FAISS_PATH)
+    save_manifest(DB_FAISS_PATH, files, INDEX_SETTINGS)
+    _prune_docstores(store)
+    logger.info(f"FAISS vector store saved. Embedding cache: {embeddings.stats()}")
+    return store if files else None
+
+def build_retriever(store):
+    if store.keyword_index is None:
+        retriever = store.as_retriever(search_kwargs={'k': RETRIEVAL_K})
+    else:
+        retriever = HybridRetriever(vector_store=store, keyword_index=store.keyword_index, executor=retrieval_executor,
+                                    k=RETRIEVAL_K, fetch_k=HYBRID_FETCH_K, rrf_k=RRF_K)
+    if CONTEXT_TOKEN_BUDGET > 0:
+        retriever = ContextPackingRetriever(base_retriever=retriever, token_budget=CONTEXT_TOKEN_BUDGET, count_tokens=count_tokens)
+    return retriever
+
+def count_tokens(text):
+    return len(llm.pipeline.tokenizer.encode(text, add_special_tokens=False))
+
+def build_qa_chain(store):
+    return RetrievalQA.from_chain_type(
+        llm=llm,
+        chain_type="stuff",
+        retriever=build_retriever(store),
+        return_source_documents=True,
+        chain_type_kwargs={"prompt": QA_PROMPT},
+    )
+
+def _configure_batch_padding(llm):
+    # Batched prompts have different lengths; a decoder-only model must be padded on the left
+    # so every prompt ends right where generation starts. TinyLlama has no pad token of its own.
+    tokenizer = llm.pipeline.tokenizer
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+
+def generate_batch(prompts):
+    """Runs on an inference worker: one pipeline call for the whole batch of prompts."""
+    return [generations[0].text for generations in llm.generate(prompts).generations]
+
+def build_prompt(question, docs):
+    return QA_PROMPT.format(context="\n\n".join(doc.page_content for doc in docs), question=question)
+
 def setup_rag_pipeline():
     """
     Initializes the RAG pipeline: loads documents, creates embeddings,
     and sets up the QA chain. This is called on application startup.
     """
-    global db, qa_chain
+    global db, qa_chain, llm, embeddings, index_version
 
     if not os.path.exists(DOCS_PATH) or not os.listdir(DOCS_PATH):
         logger.warning(f"'{DOCS_PATH}' directory is empty or does not exist. The RAG system will not have any documents to query.")
-        return
-
-    # 1. Load Documents
-    docs = []
-    for filename in os.listdir(DOCS_PATH):
-        if filename.endswith(".pdf"):
-            loader = PyPDFLoader(os.path.join(DOCS_PATH, filename))
-            docs.extend(loader.load())
-    
-    if not docs:
-        logger.warning("No PDF documents were loaded. QA chain will not be functional.")
-        return
-
-    # 2. Split Documents into Chunks
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    texts = text_splitter.split_documents(docs)
 
-    # 3. Create Embeddings
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, model_kwargs={'device': DEVICE})
+    # 1. Create Embeddings
+    embeddings = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, model_kwargs={'device': DEVICE}),
+        EMBEDDING_MODEL_NAME,
+        EMBEDDING_CACHE_DIR,
+    )
 
-    # 4. Create and Persist Vector Store (FAISS)
-    logger.info("Creating FAISS vector store from documents...")
-    db = FAISS.from_documents(texts, embeddings)
-    db.save_local(DB_FAISS_PATH)
-    logger.info("FAISS vector store created and saved.")
+    # 2. Load the saved vector store and apply any document changes
+    with index_lock:
+        db = sync_vector_store()
+        index_version = manifest_index_version(load_manifest(DB_FAISS_PATH))
+    if db is None:
+        logger.warning("No PDF documents were loaded. QA chain will not be functional until documents are added and /reindex is called.")
 
-    # 5. Initialize LLM
+    # 3. Initialize LLM
     llm = HuggingFacePipeline.from_model_id(
         model_id=LLM_MODEL_NAME,
         task="text-generation",
         device_map="auto",  # Use "auto" to leverage GPU if available
-        pipeline_kwargs={
-            "max_new_tokens": 256,
-            "top_p": 0.95,
-            "temperature": 0.1,
-            "repetition_penalty": 1.15
-        },
+        pipeline_kwargs=LLM_PIPELINE_KWARGS,
+        batch_size=GENERATION_MAX_BATCH_SIZE,
     )
+    _configure_batch_padding(llm)
 
-    # 6. Create QA Chain
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=db.as_retriever(search_kwargs={'k': 2}),
-        return_source_documents=True
-    )
+    # 4. Create QA Chain
+    if db is not None:
+        qa_chain = build_qa_chain(db)
     logger.info("RAG pipeline setup complete.")
 
+def reindex():
+    global db, qa_chain, index_version
+    try:
+        new_db = sync_vector_store()
+        new_chain = build_qa_chain(new_db) if new_db is not None else None
+        new_version = manifest_index_version(load_manifest(DB_FAISS_PATH))
+        old_version = index_version
+        # Reference assignments: in-flight queries finish on the chain they already hold.
+        db, qa_chain, index_version = new_db, new_chain, new_version
+        if answer_cache is not None and new_version != old_version:
+            # Entries are scoped to the index version. A reindex that changed nothing keeps the
+            # version, and its entries stay valid; otherwise they can no longer match, so free them.
+            answer_cache.clear()
+        logger.info("Reindex complete.")
+    except Exception as e:
+        logger.error(f"Error during reindex: {e}")
+    finally:
+        index_lock.release()
+
 @app.on_event("startup")
 def startup_event():
     """
@@ -104,6 +417,22 @@ def startup_event():
     """
     setup_rag_pipeline()
 
+@app.on_event("startup")
+async def start_generation_batcher():
+    global generation_batcher
+    if GENERATION_BATCHING_ENABLED:
+        generation_batcher = GenerationBatcher(generate_batch, inference_executor, GENERATION_MAX_BATCH_SIZE,
+                                               GENERATION_MAX_WAIT_MS, GENERATION_MAX_PENDING)
+        await generation_batcher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if generation_batcher is not None:
+        await generation_batcher.stop()
+    inference_executor.shutdown()
+    query_executor.shutdown()
+    retrieval_executor.shutdown(wait=False)
+
 
 @app.get("/", response_class=HTMLResponse, tags=["UI"])
 async def read_root():
@@ -137,18 +466,49 @@ async def read_root():
                     const responseDiv = document.getElementById('response');
                     responseDiv.innerHTML = 'Thinking...';
                     
-                    const response = await fetch('/query-api', {
+                    const response = await fetch('/query-stream', {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
                         body: JSON.stringify({ text: query })
                     });
-                    
-                    const result = await response.json();
-                    
-                    if(response.ok) {
-                        responseDiv.innerHTML = `<div class="result"><h2>Answer:</h2><p>${result.answer}</p><h3>Sources:</h3><p><pre>${JSON.stringify(result.sources, null, 2)}</pre></p></div>`;
-                    } else {
+
+                    if(!response.ok) {
+                        const result = await response.json();
                         responseDiv.innerHTML = `<div class="result" style="background-color: #fdd;"><h2>Error:</h2><p>${result.detail}</p></div>`;
+                        return;
+                    }
+
+                    responseDiv.innerHTML = '<div class="result"><h2>Answer:</h2><p id="answer"></p><h3>Sources:</h3><p><pre id="sources">Retrieving...</pre></p></div>';
+                    const answer = document.getElementById('answer');
+                    const sources = document.getElementById('sources');
+
+                    // Server-Sent Events over a POST body: split on blank lines, read "event:" and "data:".
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    while (true) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffer += decoder.decode(value, { stream: true });
+                        let boundary;
+                        while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {
+                            const message = buffer.slice(0, boundary);
+                            buffer = buffer.slice(boundary + 2);
+                            let event = 'message', data = '';
+                            for (const line of message.split('\\n')) {
+                                if (line.startsWith('event: ')) event = line.slice(7);
+                                else if (line.startsWith('data: ')) data += line.slice(6);
+                            }
+                            const payload = JSON.parse(data);
+                            if (event === 'sources') {
+                                sources.textContent = JSON.stringify(payload, null, 2);
+                            } else if (event === 'token') {
+                                answer.textContent += payload.text;
+                            } else if (event === 'error') {
+                                answer.parentElement.style.backgroundColor = '#fdd';
+                                answer.textContent += ` [Error: ${payload.detail}]`;
+                            }
+                        }
                     }
                 });
             </script>
@@ -157,23 +517,231 @@ async def read_root():
     """
     return HTMLResponse(content=html_content)
 
+@app.get("/metrics", tags=["Admin"])
+def metrics():
+    return {
+        "inference": inference_executor.stats(),
+        "query_preparation": query_executor.stats(),
+        "generation_batching": generation_batcher.stats() if generation_batcher is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "search_index": search_index_stats(db) if db is not None else None,
+    }
+
+def search_index_stats(store):
+    return {
+        **search_params(store.index),
+        "rerank_factor": store.rerank_factor if store.rerank_vectors is not None else None,
+        "docstore": type(store.docstore).__name__,
+        "keyword_index": store.keyword_index.stats() if store.keyword_index is not None else None,
+    }
+
+@app.post("/search-params", tags=["Admin"])
+def update_search_params(params: SearchParams):
+    """
+    Tunes the recall/latency trade-off of an approximate index without a rebuild:
+    `nprobe` IVF cells scanned per query, `ef_search` HNSW candidates explored,
+    `rerank_factor` candidates per result re-ranked exactly (0 turns re-ranking off).
+    """
+    for name, value in params.dict().items():
+        if value is not None:
+            minimum = 0 if name == "rerank_factor" else 1
+            if value < minimum:
+                raise HTTPException(status_code=422, detail=f"{name} must be at least {minimum}.")
+            search_settings[name] = value
+    if db is not None:
+        _apply_search_settings(db)
+    return {"search_settings": search_settings, "search_index": search_index_stats(db) if db is not None else None}
+
+@app.post("/reindex", status_code=202, tags=["Admin"])
+def trigger_reindex(background_tasks: BackgroundTasks):
+    """
+    Applies added, modified and deleted PDFs in ./docs to the index in the
+    background. Queries keep being served from the current index until the
+    updated one is swapped in.
+    """
+    if embeddings is None or llm is None:
+        raise HTTPException(status_code=503, detail="RAG pipeline is still starting up.")
+    if not index_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A reindex is already running.")
+    background_tasks.add_task(reindex)
+    return {"status": "Reindex scheduled"}
+
 @app.post("/query-api", tags=["API"])
 async def handle_query(query: Query):
     """
     Handles a query by retrieving relevant context and generating an answer.
     """
-    if not qa_chain:
+    chain, version = qa_chain, index_version
+    if not chain:
         raise HTTPException(status_code=503, detail="RAG pipeline is not available. Check server logs for errors during setup.")
     
     logger.info(f"Received query: {query.text}")
     try:
-        result = qa_chain.invoke({"query": query.text})
-        answer = result.get('result')
-        sources = [
-            {"source": doc.metadata.get('source', 'N/A'), "page": doc.metadata.get('page', 'N/A')} 
-            for doc in result.get('source_documents', [])
-        ]
-        return {"answer": answer, "sources": sources}
+        cached, query_embedding = await _lookup_answer(version, query.text)
+        if cached is not None:
+            return cached
+        if generation_batcher is not None:
+            result = await asyncio.wait_for(_answer_batched(chain, query.text, query_embedding), INFERENCE_TIMEOUT_S)
+        else:
+            # Retrieval and generation block for seconds; run them off the event loop.
+            result = await inference_executor.run(_answer, chain, query.text, query_embedding)
+    except QueueFullError:
+        raise HTTPException(status_code=429, detail="Too many queries are waiting. Please retry shortly.", headers={"Retry-After": "5"})
+    except asyncio.TimeoutError:
+        # A timeout inside an executor's `run` is counted there; one in the batcher is counted here.
+        if generation_batcher is not None:
+            inference_executor.record_timeout()
+        raise HTTPException(status_code=503, detail=f"The query did not complete within {INFERENCE_TIMEOUT_S} seconds.")
     except Exception as e:
         logger.error(f"Error during query processing: {e}")
         raise HTTPException(status_code=500, detail="An internal error occurred while processing the query.")
+
+    answer = result.get('result')
+    sources = format_sources(result.get('source_documents', []))
+    response = {"answer": answer, "sources": sources}
+    if answer_cache is not None:
+        answer_cache.put(version, query.text, query_embedding, response)
+    return response
+
+async def _lookup_answer(version, question):
+    """Returns (cached response or None, query embedding for a later put)."""
+    if answer_cache is None:
+        return None, None
+    # A semantic lookup embeds the query, which is CPU work; keep it off the loop, behind the queue limit.
+    return await query_executor.run(answer_cache.lookup, version, question, embeddings.embed_query)
+
+def _retrieve(chain, question, query_embedding=None):
+    """Retrieves context, reusing the embedding from the answer cache lookup so the query is embedded once."""
+    if query_embedding is None:
+        return chain.retriever.invoke(question)
+    return chain.retriever.invoke(question, query_embedding=query_embedding)
+
+def _answer(chain, question, query_embedding=None):
+    """What `chain.invoke` does, but with `_retrieve`."""
+    docs = _retrieve(chain, question, query_embedding)
+    answer = chain.combine_documents_chain.invoke({"input_documents": docs, "question": question})["output_text"]
+    return {"result": answer, "source_documents": docs}
+
+async def _answer_batched(chain, question, query_embedding=None):
+    # Retrieval runs per request on the bounded query executor; only the generation goes through the batcher.
+    docs = await query_executor.run(_retrieve, chain, question, query_embedding)
+    answer = await generation_batcher.submit(build_prompt(question, docs))
+    return {"result": answer, "source_documents": docs}
+
+def format_sources(docs):
+    return [
+        {"source": doc.metadata.get('source', 'N/A'), "page": doc.metadata.get('page', 'N/A')}
+        for doc in docs
+    ]
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class _StopWhenSet(StoppingCriteria):
+    """Ends generation at the next decoding step once `event` is set."""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+def _stream_answer(chain, question, query_embedding, emit, stop):
+    """
+    Runs on an inference worker: retrieves, reports the sources, then streams tokens until done or stopped.
+
+    The pipeline generates on a helper thread that feeds the streamer with the
+    same settings as /query-api. Setting `stop` ends generation itself, not
+    just the reading, and the thread is joined before the worker is released,
+    so a stream never generates outside the executor's concurrency limit.
+    """
+    docs = _retrieve(chain, question, query_embedding)
+    emit("sources", format_sources(docs))
+    streamer = TextIteratorStreamer(llm.pipeline.tokenizer, timeout=INFERENCE_TIMEOUT_S, skip_prompt=True, skip_special_tokens=True)
+    errors = []
+
+    def generate():
+        try:
+            llm.pipeline(build_prompt(question, docs), streamer=streamer,
+                         stopping_criteria=StoppingCriteriaList([_StopWhenSet(stop)]), **LLM_PIPELINE_KWARGS)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    generation = threading.Thread(target=generate, daemon=True)
+    generation.start()
+    try:
+        for token in streamer:
+            if stop.is_set():
+                break
+            emit("token", {"text": token})
+    finally:
+        stop.set()
+        generation.join()
+    if errors:
+        raise errors[0]
+
+_STREAM_END = object()
+
+@app.post("/query-stream", tags=["API"])
+async def handle_query_stream(query: Query):
+    """
+    Like /query-api, but answers as Server-Sent Events: one `sources` event as
+    soon as retrieval finishes, a `token` event per generated token, then
+    `done` (or `error`). Queue limits apply before the stream starts.
+    """
+    chain, version = qa_chain, index_version
+    if not chain:
+        raise HTTPException(status_code=503, detail="RAG pipeline is not available. Check server logs for errors during setup.")
+
+    logger.info(f"Received streaming query: {query.text}")
+    try:
+        cached, query_embedding = await _lookup_answer(version, query.text)
+    except QueueFullError:
+        raise HTTPException(status_code=429, detail="Too many queries are waiting. Please retry shortly.", headers={"Retry-After": "5"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail=f"The query did not complete within {INFERENCE_TIMEOUT_S} seconds.")
+    if cached is not None:
+        replay = [_sse("sources", cached["sources"]), _sse("token", {"text": cached["answer"]}), _sse("done", {})]
+        return StreamingResponse(iter(replay), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    stop = threading.Event()
+    emit = lambda event, data: loop.call_soon_threadsafe(events.put_nowait, (event, data))
+    try:
+        generation = inference_executor.submit(_stream_answer, chain, query.text, query_embedding, emit, stop)
+    except QueueFullError:
+        raise HTTPException(status_code=429, detail="Too many queries are waiting. Please retry shortly.", headers={"Retry-After": "5"})
+    generation.add_done_callback(lambda _: events.put_nowait(_STREAM_END))
+
+    async def event_stream():
+        deadline = loop.time() + INFERENCE_TIMEOUT_S
+        sources, tokens = [], []
+        try:
+            while True:
+                item = await asyncio.wait_for(events.get(), max(deadline - loop.time(), 0))
+                if item is _STREAM_END:
+                    break
+                event, data = item
+                if event == "sources":
+                    sources = data
+                else:
+                    tokens.append(data["text"])
+                yield _sse(event, data)
+            if generation.exception() is not None:
+                logger.error(f"Error during streaming query: {generation.exception()}")
+                yield _sse("error", {"detail": "An internal error occurred while processing the query."})
+            else:
+                if answer_cache is not None:
+                    answer_cache.put(version, query.text, query_embedding, {"answer": "".join(tokens), "sources": sources})
+                yield _sse("done", {})
+        except asyncio.TimeoutError:
+            inference_executor.record_timeout()
+            yield _sse("error", {"detail": f"The query did not complete within {INFERENCE_TIMEOUT_S} seconds."})
+        finally:
+            # Also reached when the client disconnects: stop generating for nobody.
+            stop.set()
+            generation.cancel()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,64 @@
+import json
+import sqlite3
+import threading
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Docstore that keeps chunk text and metadata in a SQLite file and reads
+    them by id on demand, instead of holding every chunk in the process.
+
+    Pickles as its file path only, so FAISS.save_local/load_local persist the
+    store without copying the text into `index.pkl`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Queries come from the threadpool, the inference workers and the reindex task.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+        self._conn.commit()
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def search(self, search: str):
+        with self._lock:
+            row = self._conn.execute("SELECT text, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts):
+        rows = [(doc_id, doc.page_content, json.dumps(doc.metadata)) for doc_id, doc in texts.items()]
+        with self._lock:
+            try:
+                self._conn.executemany("INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)", rows)
+                self._conn.commit()
+            except sqlite3.IntegrityError:
+                self._conn.rollback()
+                raise ValueError("Tried to add ids that already exist in the docstore.")
+
+    def delete(self, ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(doc_id,) for doc_id in ids])
+            self._conn.commit()
+
+    def copy_to(self, path: str) -> "SQLiteDocstore":
+        """Returns an independent copy at `path`, so an index update never touches the served store's file."""
+        target = sqlite3.connect(path)
+        with self._lock:
+            self._conn.backup(target)
+        target.close()
+        return SQLiteDocstore(path)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,81 @@
+import os
+from pathlib import Path
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from ann_index import exact_rerank
+
+RERANK_VECTORS_FILENAME = "vectors.f32"
+
+
+class RerankingFAISS(FAISS):
+    """
+    FAISS store for quantized indexes that re-ranks by exact distance.
+
+    The float vectors are kept beside the index in `vectors.f32`, one row per
+    index position, and memory-mapped: a query fetches `k * rerank_factor`
+    candidates from the compact index and reads only those rows to re-order
+    them, so the full-precision vectors never have to be resident.
+    """
+
+    def __init__(self, *args, rerank_factor: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rerank_factor = rerank_factor
+        self.rerank_vectors = None
+        # BM25 index over the same chunks, kept in step and saved by the indexing code.
+        self.keyword_index = None
+
+    def similarity_search(self, query, k=4, filter=None, fetch_k=20, query_embedding=None, **kwargs):
+        """`query_embedding`, when the caller already embedded `query` (e.g. for a cache lookup), skips embedding it again."""
+        if query_embedding is None:
+            return super().similarity_search(query, k, filter=filter, fetch_k=fetch_k, **kwargs)
+        return self.similarity_search_by_vector(query_embedding, k, filter=filter, fetch_k=fetch_k, **kwargs)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, fetch_k=20, **kwargs):
+        if self.rerank_vectors is None or self.rerank_factor < 1 or filter is not None:
+            return super().similarity_search_with_score_by_vector(embedding, k, filter=filter, fetch_k=fetch_k, **kwargs)
+        query = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(query)
+        _, candidates = self.index.search(query, k * self.rerank_factor)
+        distances, positions = exact_rerank(self.rerank_vectors, query[0], candidates[0], k)
+        docs = []
+        for distance, i in zip(distances, positions):
+            doc = self.docstore.search(self.index_to_docstore_id[i])
+            if not isinstance(doc, Document):
+                raise ValueError(f"Could not find document for id {self.index_to_docstore_id[i]}, got {doc}")
+            docs.append((doc, distance))
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            docs = [(doc, distance) for doc, distance in docs if distance <= score_threshold]
+        return docs
+
+    def save_local(self, folder_path: str, index_name: str = "index") -> None:
+        """Also writes (or removes) the re-rank vectors, then maps them back in place of the in-memory copy."""
+        super().save_local(folder_path, index_name)
+        path = os.path.join(folder_path, RERANK_VECTORS_FILENAME)
+        if self.rerank_vectors is None:
+            Path(path).unlink(missing_ok=True)
+            return
+        tmp_path = f"{path}.tmp"
+        np.ascontiguousarray(self.rerank_vectors, dtype=np.float32).tofile(tmp_path)
+        # A replaced file stays readable through the old store's mapping until it is dropped.
+        os.replace(tmp_path, path)
+        self.attach_rerank_vectors(folder_path)
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings, index_name: str = "index", **kwargs):
+        store = super().load_local(folder_path, embeddings, index_name, **kwargs)
+        store.attach_rerank_vectors(folder_path)
+        return store
+
+    def attach_rerank_vectors(self, folder_path: str):
+        path = os.path.join(folder_path, RERANK_VECTORS_FILENAME)
+        rows = self.index.ntotal
+        if os.path.exists(path) and rows and os.path.getsize(path) == rows * self.index.d * 4:
+            self.rerank_vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, self.index.d))
+        else:
+            self.rerank_vectors = None